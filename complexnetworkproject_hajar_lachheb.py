@@ -20,11 +20,19 @@ The project will utilize several resources to deepen the understanding of the su
 """
 
 # Commented out IPython magic to ensure Python compatibility.
-import networkx as nx
 import numpy as np
-import random as rd
-import matplotlib.pyplot as plt
-from itertools import combinations
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+from multiprocessing import shared_memory
+import json
+import os
+from statistics import NormalDist
+import weakref
+import zlib
+import platform
+import sys
+import time
 
 # %matplotlib inline
 
@@ -41,54 +49,110 @@ Then we switch to developing the function game_simulation. It was developed to b
 The update is done synchronously, meaning all players are updated simultaneously. The simulation tracks the fraction of cooperators (C) over time and returns the final fraction of cooperators (p).
 """
 
-Nrep = 20
-d_0 = 0.5 
-Tmax = 500
-Ttrans = 400
+SimulationConfig = namedtuple('SimulationConfig', ['Nrep', 'd_0', 'Tmax', 'Ttrans', 'n_points'], defaults=[20, 0.5, 500, 400, 50])
+config = SimulationConfig()
+
+def configure(base=None, **changes):
+    global config
+    new = (config if base is None else base)._replace(**changes)
+    if not 0 <= new.Ttrans < new.Tmax:
+        raise ValueError(f'need 0 <= Ttrans < Tmax, got Ttrans={new.Ttrans} and Tmax={new.Tmax}')
+    previous, config = config, new
+    return previous
 
 # C: collaborators
 # D: defectors
 
 def payoff_node(n, G, C, S, T): 
-    payoff = 0
+    cooperators = 0
+    for i in G.neighbors(n):
+        if i in C:
+            cooperators += 1
+    defectors = len(G.adj[n]) - cooperators
     if n in C:
-        for i in G.neighbors(n):
-            if i in C:
-                payoff += 1
-            else:
-                payoff += S
+        return cooperators + defectors * S
     else:
-        for i in G.neighbors(n):
-            if i in C:
-                payoff += T
-            else:
-                payoff += 0
-    return payoff                        
-
-def game_simulation(G,T,S, update_rule, plot_time=False): 
+        return cooperators * T
+
+def game_simulation(G,T,S, update_rule, plot_time=False, backend='networkx', matrix=None, rng=None, update='synchronous', start=None, checkpoint=None, checkpoint_every=None, recorder=None, instrument=None): 
+    rng = np.random.default_rng(rng) if start is None or start.rng_state is None else _restore_rng(start.rng_state)
+    if update not in update_modes:
+        raise ValueError(f'unknown update mode {update!r}, expected one of {update_modes}')
+    if update != 'synchronous' and backend not in ('networkx', 'csr'):
+        raise ValueError(f"update={update!r} needs backend='networkx' or 'csr'")
+    if backend == 'vectorized':
+        if start is not None or checkpoint is not None:
+            raise ValueError("snapshots need backend='networkx' or 'csr'")
+        return vectorized_game_simulation(G, T, S, update_rule, plot_time, rng, matrix, recorder, instrument)
+    matrix = _payoff_matrix(T, S, matrix)
+    save = checkpoint if checkpoint is None or callable(checkpoint) else (lambda snapshot: save_snapshot(checkpoint, snapshot))
+    random = BlockRandom(rng)
+    if start is not None and start.block is not None:
+        random.values = list(start.block)
     nodes = list(G.nodes())
-    C = set(nodes) 
     N = len(nodes)
-    n_d_0 = round(d_0 * N)
-    D_0 = set(rd.sample(C, n_d_0)) 
-    C = C - D_0 
-    P = 0 
+    n_d_0 = round(config.d_0 * N)
+    C = StrategyArray(nodes)
+    if start is None:
+        C.values[rng.choice(N, n_d_0, replace=False)] = 0 
+        P, t_0 = 0, 0
+    else:
+        C.values[:] = unpack_strategies(start.strategies, N)
+        P, t_0 = start.P, start.step
     p_t=[len(C)/N,]
-    for t in range(0,Tmax):
-
-        payoffs = []
-        for n in nodes:
-            payoffs.append(payoff_node(n,G, C, S, T))
-        new_C = set() # nomore_D
-        new_D = set() # nomore_C
-        for i in nodes: 
-            s = update_rule(i,G, C, S, T, payoffs)
-            if s == 'C':
-                new_C.add(i)
-            if s == 'D':
-                new_D.add(i)
-        C = (C | new_C) - new_D 
+    node_constants(G, refresh=True)
+    if backend == 'csr':
+        csr = csr_graph(G)
+    new = np.empty(N, dtype=np.int8)
+    if update != 'synchronous':
+        cooperating = cooperating_neighbors(csr_graph(G), C.values).tolist()
+        payoffs = Payoffs((_node_payoff(x, k, c, matrix) for x, k, c in zip(C.bytes, node_constants(G).degree.values(), cooperating)), random, matrix)
+    if recorder is not None:
+        recorder.begin(np.fromiter(node_constants(G).degree.values(), dtype=np.int64, count=N), C.values)
+    if instrument is not None:
+        instrument.begin(update_rule, backend if update == 'synchronous' else update, N)
+    for t in range(t_0,config.Tmax):
+
+        if instrument is not None:
+            before = C.values.copy()
+        if update != 'synchronous':
+            order = rng.permutation(N) if update == 'random_sequential' else rng.integers(0, N, rng.poisson(N))
+            asynchronous_step(G, nodes, C, S, T, update_rule, payoffs, cooperating, matrix, order.tolist())
+        elif backend == 'csr':
+            payoffs = Payoffs(game_payoffs(csr, C.values, matrix).tolist(), random, matrix)
+        elif matrix.R == 1 and matrix.P == 0 and matrix.normalization == 'accumulated':
+            payoffs = Payoffs((payoff_node(n,G, C, S, T) for n in nodes), random, matrix)
+        else:
+            payoffs = Payoffs((matrix_payoff_node(n, G, C, matrix) for n in nodes), random, matrix)
+        if instrument is not None:
+            instrument.lap('payoff' if update == 'synchronous' else 'rule')
+        if update == 'synchronous':
+            new[:] = -1
+            for k, i in enumerate(nodes): 
+                s = update_rule(i,G, C, S, T, payoffs)
+                if s == 'C':
+                    new[k] = 1 # nomore_D
+                if s == 'D':
+                    new[k] = 0 # nomore_C
+            if instrument is not None:
+                instrument.lap('rule')
+            C.values[new == 1] = 1
+            C.values[new == 0] = 0
         C_len = len(C)
+        if instrument is not None:
+            instrument.lap('commit')
+        if save is not None and (C_len in (0, N) or t + 1 == config.Tmax or (checkpoint_every and (t + 1) % checkpoint_every == 0)):
+            snapshot = Snapshot(N, pack_strategies(C.values), _rng_state(rng), t + 1, P + C_len * (t >= config.Ttrans), np.array(random.values))
+            save(snapshot)
+        if recorder is not None:
+            recorder.record(C.values)
+            if C_len in (0, N):
+                recorder.close()
+        if instrument is not None:
+            instrument.step(t, int(np.count_nonzero(before != C.values)), C_len, N if update == 'synchronous' else len(order))
+            if C_len in (0, N):
+                instrument.end(t + 1 - t_0, 'absorbed')
+                instrument.finish()
         if C_len == 0:
             return 0
         if C_len == N:
@@ -97,12 +161,18 @@ def game_simulation(G,T,S, update_rule, plot_time=False):
         if plot_time == True:
             p_t.append(C_len/N)
 
-        if t>=Ttrans:
-            P += len(C)
+        if t>=config.Ttrans:
+            P += C_len
             
-    p = P/(N*(Tmax-Ttrans))
+    if recorder is not None:
+        recorder.close()
+    if instrument is not None:
+        instrument.end(config.Tmax - t_0, 'horizon')
+        instrument.finish()
+    p = P/(N*(config.Tmax-config.Ttrans))
     
     if plot_time == True:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10,6))
         plt.title(f'N = {N}, S = {S}, T = {T}')
         plt.plot(p_t)
@@ -120,110 +190,46 @@ To explain it briefly, the first code simulates a game based on the Prisoner's D
 In the second game simulation, we instead simulate a game known as the Snowdrift game, where players can choose to be hawks or doves. The payoffs are determined by the interaction between hawks and doves in the neighborhood. Hawks engage in a fight with a cost, and the winner receives a reward. The goal is to examine the evolution of hawk and dove strategies in a networked context.
 """
 
-Nrep = 20
-d_0 = 0.5 
-Tmax = 500
-Ttrans = 400
-
 R = 1.0  
 C = 0.5  
 
-def payoff_node(n, G, H, R, C):
-    payoff = 0
-    if n in H:
-        hawks = [i for i in G.neighbors(n) if i in H]
-        doves = [i for i in G.neighbors(n) if i not in H]
-        total_players = len(hawks) + len(doves)
-        payoff += R / 2  
-
-        if len(hawks) > 0: 
-            payoff -= C / 2
-            payoff += R / 2
-
-    else:
-        hawks = [i for i in G.neighbors(n) if i in H]
-        doves = [i for i in G.neighbors(n) if i not in H]
-        total_players = len(hawks) + len(doves)
-        payoff += R / 2  
-
-        if len(hawks) > 0: 
-            payoff += R
-
-    return payoff
-
-
 def update_rule(n, G, H, R, C, payoffs):
-    if random.random() < payoffs[n]:
+    if as_payoffs(payoffs).random.random() < payoffs[n]:
         return 'H'
     else:
         return 'D'
 
 
-def snowdrift_game_simulation(G, R, C, update_rule, plot_time=False):
-    nodes = list(G.nodes())
-    H = set(nodes)  
-    N = len(nodes)
-    n_d_0 = round(d_0 * N)  
-    D_0 = set(random.sample(H, n_d_0))  
-    H = H - D_0  
-    P = 0
-    p_t = [len(H) / N, ]
-
-    for t in range(Tmax):
-        payoffs = [payoff_node(n, G, H, R, C) for n in nodes]
-        new_H = set() 
-        new_D = set()  
-
-        for i in nodes:
-            s = update_rule(i, G, H, R, C, payoffs)
-            if s == 'H':
-                new_H.add(i)
-            if s == 'D':
-                new_D.add(i)
-
-        H = (H | new_H) - new_D
-
-        H_len = len(H)
-        if H_len == 0:
-            return 0
-        if H_len == N:
-            return 1
-
-        if plot_time:
-            p_t.append(H_len / N)
-
-        if t >= Ttrans:
-            P += H_len
-
-    p = P / (N * (Tmax - Ttrans))
-
-    if plot_time:
-        plt.figure(figsize=(10, 6))
-        plt.title(f'N = {N}, R = {R}, C = {C}')
-        plt.plot(p_t)
-        plt.xlabel('time')
-        plt.ylabel('fraction of Hawks')
-
-    return p
+def snowdrift_game_simulation(G, R, C, update_rule, plot_time=False, backend='networkx', rng=None):
+    if backend == 'vectorized':
+        raise ValueError("snowdrift_game_simulation needs backend='networkx' or 'csr', its update rule has no kernel")
+    matrix = hawk_dove_matrix(R, C)
+    def rule(i, G, H, S, T, payoffs):
+        s = update_rule(i, G, H, R, C, payoffs)
+        return 'C' if s == 'H' else s
+    return game_simulation(G, matrix.T, matrix.S, rule, plot_time, backend, matrix, rng)
 
 """##Defining the update rules  ✅
 
 In this part, we are trying to define all the update rules we will use in our experiment. Further explanation of these rules will be detailed in the report. The update rules are : Random Rule, Stochastic Best Response Rule, Generous tit for tat rule, Replicator Rule, Multiple Replicator Rule, unconditional_imitation_rule, Moran Rule and Fermi Rule.
 """
 
-import random
-
 def random_rule(i, G, C, S, T, payoffs):
+    random = as_payoffs(payoffs).random
     if random.random() < 0.5:
         return 'C'
     else:
         return 'D'
 
 def stochastic_best_response_rule(i, G, C, S, T, payoffs):
-    Ni = list(G.neighbors(i))
+    random = as_payoffs(payoffs).random
+    Ni = node_constants(G).neighbors[i]
     if Ni != []:
         best_response = max(Ni, key=lambda j: payoffs[j])
-        probability = (payoffs[best_response] - payoffs[i]) / max(payoffs)
+        highest = payoff_max(payoffs)
+        if highest <= 0:
+            return
+        probability = (payoffs[best_response] - payoffs[i]) / highest
         if random.random() < probability:
             if best_response in C:
                 return 'C'
@@ -231,7 +237,8 @@ def stochastic_best_response_rule(i, G, C, S, T, payoffs):
                 return 'D'
 
 def generous_tit_for_tat_rule(i, G, C, S, T, payoffs):
-    Ni = list(G.neighbors(i))
+    random = as_payoffs(payoffs).random
+    Ni = node_constants(G).neighbors[i]
     if Ni != []:
         j = random.choice(Ni)
         if payoffs[j] > payoffs[i]:
@@ -244,43 +251,50 @@ def generous_tit_for_tat_rule(i, G, C, S, T, payoffs):
     return 'C'
 
 def replicator_rule(i,G, C, S, T, payoffs):
-    Ni = list(G.neighbors(i))
+    payoffs = as_payoffs(payoffs)
+    random, matrix = payoffs.random, payoffs.matrix
+    constants = node_constants(G)
+    Ni = constants.neighbors[i]
     ki = len(Ni)
     if Ni!=[]:
-        j = rd.choice(Ni)                
+        j = random.choice(Ni)                
         if payoffs[j] > payoffs[i]:
-            kj = G.degree(j) 
-            phi = max(ki,kj)*(max(1,T) - min(0,S)) 
+            kj = constants.degree[j] 
+            phi = _degree_scale(max(ki,kj), matrix)*_phi_scale(T, S, matrix) 
             probability = (payoffs[j]-payoffs[i])/phi
-            if rd.random() < probability:
+            if random.random() < probability:
                 if j in C:
                     return 'C'
                 else:  
                     return 'D'
 
 def multiple_replicator_rule(i,G, C, S, T, payoffs):
-    Ni = list(G.neighbors(i))
+    payoffs = as_payoffs(payoffs)
+    random, matrix = payoffs.random, payoffs.matrix
+    constants = node_constants(G)
+    Ni = constants.neighbors[i]
     ki = len(Ni)
     probabilities = {}
     if Ni==[]:
         return
+    scale = _phi_scale(T, S, matrix)
     for j in Ni:
         if payoffs[j] > payoffs[i]:
-            kj = G.degree(j) 
-            phi = max(ki,kj)*(max(1,T) - min(0,S)) 
+            kj = constants.degree[j] 
+            phi = _degree_scale(max(ki,kj), matrix)*scale 
             probabilities[j] = (payoffs[j]-payoffs[i])/phi
     if probabilities == {}:
         return
 
     for j in probabilities.keys():
-        if rd.random() < probabilities[j]:
+        if random.random() < probabilities[j]:
             if j in C:
                 return 'C'
             else:  
                 return 'D'
 
 def unconditional_imitation_rule(i,G, C, S, T, payoffs): 
-    j = np.argmax(payoffs)
+    j = payoff_argmax(payoffs)
     if payoffs[j] > payoffs[i]:
         if j in C:
             return 'C'
@@ -288,31 +302,33 @@ def unconditional_imitation_rule(i,G, C, S, T, payoffs):
             return 'D'
 
 def moran_rule(i,G, C, S, T, payoffs): 
-    Ni = list(G.neighbors(i))
+    payoffs = as_payoffs(payoffs)
+    random, matrix = payoffs.random, payoffs.matrix
+    constants = node_constants(G)
+    Ni = constants.neighbors[i]
     ki = len(Ni)
     if Ni==[]:
         return 
-    j = rd.choice(Ni)
-    psi = ki
-    for n in Ni:
-        kn = G.degree(n) 
-        if kn > psi:
-            psi = kn
-    psi *= min(0,S)
-    probability = (payoffs[j] - psi)/ np.sum([payoffs[k]-psi for k in Ni+[i]])
-    if rd.random() < probability:
+    j = random.choice(Ni)
+    psi = _degree_scale(constants.neighbor_max_degree[i], matrix) * _psi_scale(T, S, matrix)
+    total = sum(payoffs[k] for k in Ni) + payoffs[i] - (ki+1)*psi
+    if total <= 0:
+        return
+    probability = (payoffs[j] - psi)/ total
+    if random.random() < probability:
         if j in C:
             return 'C'
         else:  
             return 'D'
 
 def fermi_rule(i,G, C, S, T, payoffs): 
-    Ni = list(G.neighbors(i))
+    random = as_payoffs(payoffs).random
+    Ni = node_constants(G).neighbors[i]
     if Ni!=[]:
-        j = rd.choice(Ni)   
+        j = random.choice(Ni)   
         beta = 0.1 
         probability = 1/(1+np.exp(-beta*(payoffs[j]-payoffs[i])))
-        if rd.random() < probability:
+        if random.random() < probability:
             if j in C:
                 return 'C'
             else:  
@@ -337,51 +353,84 @@ We can therefore define the fourth game theories we are using in our experiment
 Then we developed the plot function. In fact, this function takes inputs G (the network), name (a string), game (a function representing a game scenario), and update_rules (a list of strategy update rules). It generates a plot for the specified game scenario and update rules. For each update rule, it calculates the average fraction of cooperators for different combinations of T and S using the MC function. It then plots the results on the graph, with T and S values on the x-axis and the fraction of cooperators on the y-axis. The legend displays the names of the update rules used.
 """
 
-n_points = 50
-
-def MC(G, Nrep, T, S, update_rule):
+def MC(G, Nrep, T, S, update_rule, backend='networkx', convergence=None, matrix=None, update='synchronous', precision=None, instrument=None):
+    if convergence is not None and (backend != 'batched' or precision is not None):
+        raise ValueError("convergence needs backend='batched' and precision=None")
+    if precision is not None and (backend != 'networkx' or update != 'synchronous'):
+        raise ValueError("precision needs the default backend and update='synchronous'")
+    if precision is not None:
+        return adaptive_sweep(G, [(T, S)], update_rule, precision, matrix=matrix, instrument=instrument)[0][0]
+    if backend == 'batched':
+        if update != 'synchronous':
+            raise ValueError(f"update={update!r} needs backend='networkx' or 'csr'")
+        result = replica_game_simulation(G, Nrep, T, S, update_rule, convergence=convergence, matrix=matrix, instrument=instrument)
+        return (result if convergence is None else result.p).mean()
     sum_p = 0
     for _ in range(0,Nrep):
-        sum_p += game_simulation(G, T, S, update_rule)
+        sum_p += game_simulation(G, T, S, update_rule, backend=backend, matrix=matrix, update=update, instrument=instrument)
     return sum_p/Nrep
 
 def weak_prisoner_dilemma():
     print('weak prisoner’s dilemma: T in [1,2], S=0')
-    t_list = np.linspace(1.0, 2.0, num=n_points)
+    t_list = np.linspace(1.0, 2.0, num=config.n_points)
     s_list = np.zeros(len(t_list))
     return list(zip(t_list, s_list))
 
 def hawk_dove():
     print("Hawk-Dove Game: T in [2,3], S in [1,2]")
-    t_list = np.linspace(2, 3, num=n_points)
-    s_list = np.linspace(1, 2, num=n_points)
+    t_list = np.linspace(2, 3, num=config.n_points)
+    s_list = np.linspace(1, 2, num=config.n_points)
     return list(zip(t_list, s_list))
 
 def stag_hunt(): 
     print('stag hunt: diagonal line between (T,S)=(0,0) and (T,S)=(1,-1)')
-    t_list = np.linspace(0, 1.0, num=n_points)
-    s_list = np.linspace(0, -1, num=n_points)
+    t_list = np.linspace(0, 1.0, num=config.n_points)
+    s_list = np.linspace(0, -1, num=config.n_points)
     return list(zip(t_list, s_list))
 
 def snow_drift():
     print('snow drift: diagonal line between (T,S)=(1,1) and (T,S)=(2,0)')
-    t_list = np.linspace(1, 2.0, num=n_points)
-    s_list = np.linspace(1, 0, num=n_points)
+    t_list = np.linspace(1, 2.0, num=config.n_points)
+    s_list = np.linspace(1, 0, num=config.n_points)
     return list(zip(t_list, s_list))
 
-def plots(G, name, game, update_rules = [random_rule, stochastic_best_response_rule, generous_tit_for_tat_rule, replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule, fermi_rule]):
+def plots(G, name, game, update_rules = [random_rule, stochastic_best_response_rule, generous_tit_for_tat_rule, replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule, fermi_rule],
+          backend='networkx', workers=None, seed=None, cache=None, matrix=None, update='synchronous', precision=None, instrument=None):
+    if instrument is not None and workers is not None:
+        raise ValueError('instrument needs workers=None')
+    if cache is not None and (workers is None or precision is not None):
+        raise ValueError('cache needs workers and precision=None')
+    if precision is not None and (workers is not None or backend != 'networkx' or update != 'synchronous'):
+        raise ValueError("precision needs workers=None, the default backend and update='synchronous'")
+    if update != 'synchronous' and (workers is not None or backend not in ('networkx', 'csr')):
+        raise ValueError(f"update={update!r} needs backend='networkx' or 'csr' without workers")
+    import matplotlib.pyplot as plt
     _, ax = plt.subplots(figsize=(15,6))
     TS_list = game()
     TS_labels = [f'T,S = ({ts[0]:.3f},{ts[1]:.3f})' for ts in TS_list]
     plt.title(name + ' : ' + game.__name__)
     ax.set_ylim([0, 1])
     plt.grid()
+    if workers is not None:
+        p_lists = parallel_sweep(G, TS_list, update_rules, config.Nrep, workers=workers, seed=seed, cache=cache, matrix=matrix)
+    elif backend == 'batched':
+        csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+        master = _seed_sequence(seed)
     for update_rule in update_rules:
         print(update_rule.__name__)
-        p_list = []
-        for t,s in TS_list:
-            p = MC(G, Nrep, t, s, update_rule)
-            p_list.append(p)
+        if precision is not None:
+            p_list, estimates = adaptive_sweep(G, TS_list, update_rule, precision, seed, matrix, instrument)
+            ax.fill_between(TS_labels, [e.low for e in estimates], [e.high for e in estimates], alpha=0.2)
+            print(f'{sum(e.replicas for e in estimates)} replicas')
+        elif workers is not None:
+            p_list = p_lists[update_rule.__name__]
+        elif backend == 'batched':
+            p_list = sweep_game_simulation(csr, TS_list, config.Nrep, update_rule, master, matrix=matrix, instrument=instrument)
+        else:
+            p_list = []
+            for t,s in TS_list:
+                p = MC(G, config.Nrep, t, s, update_rule, backend=backend, matrix=matrix, update=update, instrument=instrument)
+                p_list.append(p)
         ax.plot(TS_labels, p_list, '-o', markersize=3, label = update_rule.__name__)
     ax.set_xticklabels(labels = TS_labels, rotation=90)
     plt.xlabel('T,S')
@@ -394,36 +443,2245 @@ We will nextly experiment using different graph structures and functions.
 """
 
 def generate_scale_free_network(N, m):
+    import networkx as nx
     return nx.barabasi_albert_graph(N, m)
 
 def generate_small_world_network(N, k, p):
+    import networkx as nx
     return nx.watts_strogatz_graph(N, k, p)
 
 def generate_community_network(N, k, p_in, p_out, num_communities):
-    G = nx.Graph()
-    nodes_per_community = N // num_communities
+    return nx_graph(community_csr(N, k, p_in, p_out, num_communities))
+
+def ER_Gnk(N,K):
+    return nx_graph(er_gnk_csr(N, K))
+
+"""##Array-backed graph core and vectorized payoffs ✅
+
+Computing the payoffs with payoff_node walks the networkx adjacency dicts and does a set lookup for every neighbor, so one step of game_simulation costs O(E) interpreted operations. This part converts the network once into compressed sparse row (CSR) arrays so that all the payoffs of a step can be computed in a single vectorized pass.
+
+The function csr_graph takes a networkx graph and returns a CSRGraph with the list of nodes, the arrays indptr and indices (the neighbors of the node at position i are indices[indptr[i]:indptr[i+1]], in the same order as G.neighbors) and the degree of every node. The function csr_from_edges builds the same structure directly from two arrays of edge endpoints.
+
+The strategies are stored as a 0/1 array s, with 1 for cooperators. The function cooperating_neighbors counts the cooperating neighbors c of every node with a cumulative sum over s[indices], and payoffs_csr turns them into the payoffs of payoff_node : a cooperator with k neighbors gets c + (k - c) * S and a defector gets c * T. Both functions also accept a stack of strategy arrays (any leading dimensions), which we will use to run several simulations together.
+
+Calling game_simulation with backend='csr' uses payoffs_csr instead of payoff_node. payoff_node counts the cooperating neighbors and uses the same formula instead of adding 1 or S neighbor by neighbor, so the two backends compute bit-identical payoffs (repeated additions of S round differently from (k - c) * S) and give the same trajectories for the same generator.
+"""
 
-    for i in range(num_communities):
-        community = nx.watts_strogatz_graph(nodes_per_community, k, p_in)
-        G = nx.disjoint_union(G, community)
+CSRGraph = namedtuple('CSRGraph', ['nodes', 'indptr', 'indices', 'degree'])
 
-    for i in range(num_communities):
-        for j in range(i+1, num_communities):
-            if rd.random() < p_out:
-                nodes_i = list(range(i * nodes_per_community, (i+1) * nodes_per_community))
-                nodes_j = list(range(j * nodes_per_community, (j+1) * nodes_per_community))
-                edge = (rd.choice(nodes_i), rd.choice(nodes_j))
-                G.add_edge(*edge)
+def _index_dtype(N):
+    return np.int32 if N < 2**31 else np.int64
 
+def csr_graph(G):
+    nodes = list(G.nodes())
+    position = {n: i for i, n in enumerate(nodes)}
+    degree = np.fromiter((len(G.adj[n]) for n in nodes), dtype=np.int64, count=len(nodes))
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(degree, out=indptr[1:])
+    indices = np.fromiter((position[j] for n in nodes for j in G.adj[n]), dtype=_index_dtype(len(nodes)), count=indptr[-1])
+    return CSRGraph(nodes, indptr, indices, degree)
+
+def csr_from_edges(N, u, v):
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    keys = np.sort(np.concatenate([u * N + v, v * N + u]))
+    degree = np.bincount(keys // N, minlength=N).astype(np.int64)
+    indptr = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(degree, out=indptr[1:])
+    return CSRGraph(np.arange(N), indptr, (keys % N).astype(_index_dtype(N)), degree)
+
+def cooperating_neighbors(csr, s):
+    cumulative = np.zeros(s.shape[:-1] + (len(csr.indices) + 1,), dtype=np.int64)
+    np.cumsum(s[..., csr.indices], axis=-1, out=cumulative[..., 1:])
+    return cumulative[..., csr.indptr[1:]] - cumulative[..., csr.indptr[:-1]]
+
+def _payoffs_from_counts(degree, s, c, matrix):
+    R, S, T, P, normalization = matrix
+    if normalization == 'presence':
+        degree, c = 1, np.minimum(c, 1)
+    payoffs = np.where(s == 1, c * np.float64(R) + (degree - c) * np.float64(S), c * np.float64(T) + (degree - c) * np.float64(P))
+    if normalization == 'average':
+        payoffs = payoffs / np.maximum(degree, 1)
+    return payoffs
+
+def game_payoffs(csr, s, matrix):
+    return _payoffs_from_counts(csr.degree, s, cooperating_neighbors(csr, s), matrix)
+
+def payoffs_csr(csr, s, T, S):
+    return game_payoffs(csr, s, _payoff_matrix(T, S))
+
+"""##Vectorized update rules ✅
+
+The update rules above are called once per node and per step, and each call rebuilds list(G.neighbors(i)) and draws its own random number. For our network sizes this interpreter overhead is the whole cost of a simulation. Here every rule gets a kernel that updates the whole population at once : it takes the CSRGraph, the strategy array s, the payoff array, T, S and a numpy random generator, and returns the next strategy array. The random neighbor of every node, the comparisons of payoffs and the acceptance draws are all done with array operations over the CSR adjacency, and all the kernels accept stacks of strategy arrays.
+
+The kernels follow the per-node rules exactly :
+- random_rule_kernel : every node becomes a cooperator with probability 0.5.
+- stochastic_best_response_kernel : every node looks at its neighbor with the highest payoff (the first one in the neighbor order when there are ties) and copies it with probability (payoff difference) / (highest payoff of the population).
+- generous_tit_for_tat_kernel : copies a random neighbor with a higher payoff with probability 0.8, otherwise cooperates.
+- replicator_kernel and multiple_replicator_kernel : copy a random neighbor (or the first neighbor, in the neighbor order, that passes its own draw) with probability (payoff difference) / phi.
+- unconditional_imitation_kernel : copies the node with the highest payoff of the population if its payoff is higher.
+- moran_kernel and fermi_kernel : copy a random neighbor with the Moran or the Fermi (beta = 0.1) probability.
+
+The dictionary rule_kernels gives the kernel of each update rule, and game_simulation(G, T, S, update_rule, backend='vectorized') runs the whole simulation on arrays with the kernel of update_rule. The per-node functions stay as the slow reference implementation.
+"""
+
+def _take(a, j):
+    return np.take_along_axis(a, np.broadcast_to(j, a.shape[:-1] + j.shape[-1:]), axis=-1)
+
+def _edge_sources(csr):
+    return np.repeat(np.arange(len(csr.degree)), csr.degree)
+
+def _segment_reduce(ufunc, values, csr, empty):
+    out = np.full(values.shape[:-1] + (len(csr.degree),), empty, dtype=values.dtype)
+    nonempty = csr.degree > 0
+    if nonempty.any():
+        out[..., nonempty] = ufunc.reduceat(values, csr.indptr[:-1][nonempty], axis=-1)
+    return out
+
+def _segment_first(mask, csr):
+    # position of the first True edge of every node, len(indices) if there is none
+    E = len(csr.indices)
+    return _segment_reduce(np.minimum, np.where(mask, np.arange(E), E), csr, E)
+
+def _random_neighbors(csr, shape, rng):
+    if len(csr.indices) == 0:
+        return np.zeros(shape, dtype=np.int64)
+    offsets = (rng.random(shape) * csr.degree).astype(np.int64)
+    return csr.indices[np.minimum(csr.indptr[:-1] + offsets, len(csr.indices) - 1)]
+
+def _degree_scale(k, matrix=None):
+    return k if matrix is None or matrix.normalization == 'accumulated' else np.ones_like(k)
+
+def _phi_scale(T, S, matrix=None):
+    R, S, T, P, _ = _payoff_matrix(T, S, matrix)
+    return np.maximum(R, T) - np.minimum(P, S)
+
+def _psi_scale(T, S, matrix=None):
+    R, S, T, P, _ = _payoff_matrix(T, S, matrix)
+    return np.minimum(0, np.minimum(P, S))
+
+def random_rule_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    return (rng.random(s.shape) < 0.5).astype(np.uint8)
+
+def stochastic_best_response_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    constants = rule_constants(csr, T, S) if constants is None else constants
+    values = payoffs[..., csr.indices]
+    best_values = _segment_reduce(np.maximum, values, csr, -np.inf)
+    first = _segment_first(values == best_values[..., constants.edge_sources], csr)
+    best = csr.indices[np.minimum(first, max(len(csr.indices) - 1, 0))]
+    highest = payoffs.max(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probability = (_take(payoffs, best) - payoffs) / highest
+    adopt = (csr.degree > 0) & (highest > 0) & (rng.random(s.shape) < probability)
+    return np.where(adopt, _take(s, best), s).astype(np.uint8)
+
+def generous_tit_for_tat_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    j = _random_neighbors(csr, s.shape, rng)
+    adopt = (csr.degree > 0) & (_take(payoffs, j) > payoffs) & (rng.random(s.shape) < 0.8)
+    return np.where(adopt, _take(s, j), 1).astype(np.uint8)
+
+def replicator_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    constants = rule_constants(csr, T, S) if constants is None else constants
+    j = _random_neighbors(csr, s.shape, rng)
+    payoffs_j = _take(payoffs, j)
+    phi = np.maximum(constants.degree, constants.degree[j]) * constants.phi_scale
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probability = (payoffs_j - payoffs) / phi
+    adopt = (csr.degree > 0) & (payoffs_j > payoffs) & (rng.random(s.shape) < probability)
+    return np.where(adopt, _take(s, j), s).astype(np.uint8)
+
+def multiple_replicator_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    constants = rule_constants(csr, T, S) if constants is None else constants
+    payoffs_i = payoffs[..., constants.edge_sources]
+    payoffs_j = payoffs[..., csr.indices]
+    phi = constants.edge_max_degree * constants.phi_scale
+    accept = (payoffs_j > payoffs_i) & (rng.random(payoffs_j.shape) < (payoffs_j - payoffs_i) / phi)
+    first = _segment_first(accept, csr)
+    adopt = first < len(csr.indices)
+    j = csr.indices[np.minimum(first, max(len(csr.indices) - 1, 0))]
+    return np.where(adopt, _take(s, j), s).astype(np.uint8)
+
+def unconditional_imitation_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    j = np.argmax(payoffs, axis=-1)[..., np.newaxis]
+    return np.where(_take(payoffs, j) > payoffs, _take(s, j), s).astype(np.uint8)
+
+def moran_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    constants = rule_constants(csr, T, S) if constants is None else constants
+    j = _random_neighbors(csr, s.shape, rng)
+    psi = constants.neighbor_max_degree * constants.psi_scale
+    total = _segment_reduce(np.add, payoffs[..., csr.indices], csr, 0) + payoffs - (csr.degree + 1) * psi
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probability = (_take(payoffs, j) - psi) / total
+    adopt = (csr.degree > 0) & (total > 0) & (rng.random(s.shape) < probability)
+    return np.where(adopt, _take(s, j), s).astype(np.uint8)
+
+def fermi_kernel(csr, s, payoffs, T, S, rng, constants=None):
+    j = _random_neighbors(csr, s.shape, rng)
+    beta = 0.1
+    with np.errstate(over='ignore'):
+        probability = 1/(1+np.exp(-beta*(_take(payoffs, j) - payoffs)))
+    adopt = (csr.degree > 0) & (rng.random(s.shape) < probability)
+    return np.where(adopt, _take(s, j), s).astype(np.uint8)
+
+rule_kernels = {
+    random_rule: random_rule_kernel,
+    stochastic_best_response_rule: stochastic_best_response_kernel,
+    generous_tit_for_tat_rule: generous_tit_for_tat_kernel,
+    replicator_rule: replicator_kernel,
+    multiple_replicator_rule: multiple_replicator_kernel,
+    unconditional_imitation_rule: unconditional_imitation_kernel,
+    moran_rule: moran_kernel,
+    fermi_rule: fermi_kernel,
+}
+
+def vectorized_game_simulation(G, T, S, update_rule, plot_time=False, rng=None, matrix=None, recorder=None, instrument=None):
+    rng = np.random.default_rng() if rng is None else rng
+    kernel = rule_kernels.get(update_rule, update_rule)
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    N = len(csr.nodes)
+    s = np.ones(N, dtype=np.uint8)
+    s[rng.choice(N, round(config.d_0 * N), replace=False)] = 0
+    P = 0
+    p_t = [s.sum()/N,]
+    matrix = _payoff_matrix(T, S, matrix)
+    state = payoff_state(csr, s, matrix)
+    constants = rule_constants(csr, T, S, matrix)
+    if recorder is not None:
+        recorder.begin(csr.degree, s)
+    if instrument is not None:
+        instrument.begin(kernel, 'vectorized', N)
+    for t in range(0, config.Tmax):
+        s, s_old = kernel(csr, s, state.payoffs, T, S, rng, constants), s
+        if instrument is not None:
+            instrument.lap('rule')
+        state = update_payoff_state(state, csr, s_old, s, matrix)
+        if instrument is not None:
+            instrument.lap('payoff')
+        C_len = int(s.sum())
+        if recorder is not None:
+            recorder.record(s)
+            if C_len in (0, N):
+                recorder.close()
+        if instrument is not None:
+            instrument.step(t, int(np.count_nonzero(s != s_old)), C_len, N)
+            if C_len in (0, N):
+                instrument.end(t + 1, 'absorbed')
+                instrument.finish()
+        if C_len == 0:
+            return 0
+        if C_len == N:
+            return 1
+
+        if plot_time == True:
+            p_t.append(C_len/N)
+
+        if t >= config.Ttrans:
+            P += C_len
+
+    if recorder is not None:
+        recorder.close()
+    if instrument is not None:
+        instrument.end(config.Tmax, 'horizon')
+        instrument.finish()
+    p = P/(N*(config.Tmax-config.Ttrans))
+
+    if plot_time == True:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(10,6))
+        plt.title(f'N = {N}, S = {S}, T = {T}')
+        plt.plot(p_t)
+        plt.xlabel('time')
+        plt.ylabel('fraction of cooperators')
+
+    return p
+
+"""##Incremental payoffs ✅
+
+After the transient phase most steps only change the strategy of a few nodes, but the payoffs are still recomputed from scratch, which costs O(E) per step. The payoff of a node only depends on its strategy, its degree and its number of cooperating neighbors, so we keep these counts next to the payoffs in a PayoffState, built once with payoff_state. After a step, update_payoff_state compares the old and the new strategies : for every node that switched it adds +1 (it became a cooperator) or -1 (it became a defector) to the count of each of its neighbors, and recomputes the payoffs of the switched nodes and of their neighbors only. A step then costs O(sum of the degrees of the switched nodes) instead of O(E). When so many nodes switch that this is no longer cheaper (during the first steps, or with the random rule), the state is simply rebuilt with one vectorized pass.
+
+The state works on a single strategy array or on the strategy matrix of the batched simulations, where the entries of the payoff matrix can have one value per row. All the array simulations above use it.
+"""
+
+PayoffState = namedtuple('PayoffState', ['cooperating', 'payoffs'])
+
+def payoff_state(csr, s, matrix):
+    c = cooperating_neighbors(csr, s)
+    return PayoffState(c, _payoffs_from_counts(csr.degree, s, c, matrix))
+
+def update_payoff_state(state, csr, s_old, s_new, matrix):
+    N = s_new.shape[-1]
+    s = s_new.reshape(-1, N)
+    rows, nodes = np.nonzero(s_old.reshape(-1, N) != s)
+    degree = csr.degree[nodes]
+    work = degree.sum()
+    if len(nodes) == 0:
+        return state
+    if 4 * work > len(s) * len(csr.indices):
+        return payoff_state(csr, s_new, matrix)
+    c = state.cooperating.reshape(-1, N)
+    payoffs = state.payoffs.reshape(-1, N)
+    starts = np.repeat(csr.indptr[nodes] - (np.cumsum(degree) - degree), degree)
+    neighbors = csr.indices[starts + np.arange(work)]
+    edge_rows = np.repeat(rows, degree)
+    np.add.at(c, (edge_rows, neighbors), np.repeat(2 * s[rows, nodes].astype(np.int64) - 1, degree))
+    rows = np.concatenate([rows, edge_rows])
+    nodes = np.concatenate([nodes, neighbors])
+    matrix = matrix._make([np.broadcast_to(np.asarray(x, dtype=np.float64), s_new.shape[:-1] + (1,)).reshape(-1)[rows] for x in matrix[:4]] + [matrix.normalization])
+    payoffs[rows, nodes] = _payoffs_from_counts(csr.degree[nodes], s[rows, nodes], c[rows, nodes], matrix)
+    return state
+
+"""##Replica-batched Monte Carlo ✅
+
+MC runs game_simulation Nrep times one after the other, although every replica walks the same graph with the same parameters. The function replica_game_simulation advances all the replicas together : the strategies are an (Nrep x N) matrix, the payoffs and the kernel of the update rule are applied to all the rows at once and the adjacency arrays are shared. A replica that reaches full cooperation or full defection gets its final value (1 or 0, as in game_simulation) and its row is dropped, while the other replicas keep running. It returns the fraction of cooperators of every replica, so MC(G, Nrep, T, S, update_rule, backend='batched') gives the same average as before.
+
+The (T, S) points of a game only change the payoff coefficients, so they can be batched in the same way. Every row of the strategy matrix has its own T and S, and sweep_game_simulation simulates Nrep replicas of all the points of TS_list at once and returns the p_list of plots(). The rows are processed in chunks of batch_size rows (by default about 4 million array entries per chunk) to bound the memory. The random stream of a replica is keyed by the index of its point in TS_list, or by points[k] for the k-th point when points is given (to simulate a subset of a larger set of points with their own streams), and mean=False returns the fractions of cooperators of every replica, with one row per point, instead of their mean. phase_diagram uses it for a full grid of the T-S plane and returns the matrix of fractions of cooperators, with one row per value of S and one column per value of T, and plot_phase_diagram draws it.
+"""
+
+def _initial_strategies(n_rows, N, rng):
+    s = np.ones((n_rows, N), dtype=np.uint8)
+    defectors = np.argsort(rng.random((n_rows, N)), axis=1)[:, :round(config.d_0 * N)]
+    np.put_along_axis(s, defectors, 0, axis=1)
+    return s
+
+def _simulate_rows(csr, T, S, kernel, rng, convergence=None, matrix=None, initial=None, start_step=0, final=None, instrument=None):
+    N = len(csr.nodes)
+    T = np.asarray(T, dtype=np.float64)[:, np.newaxis]
+    S = np.asarray(S, dtype=np.float64)[:, np.newaxis]
+    s = _initial_strategies(len(T), N, rng) if initial is None else unpack_strategies(initial, N)
+    p = np.zeros(len(T))
+    P = np.zeros(len(T))
+    active = np.arange(len(T))
+    matrix = _payoff_matrix(T, S, matrix)
+    state = payoff_state(csr, s, matrix)
+    constants = rule_constants(csr, T, S, matrix)
+    if convergence is not None:
+        monitor = StationarityMonitor(convergence, len(T), N, kernel in deterministic_kernels)
+        stationary_step = np.zeros(len(T), dtype=np.int64)
+        stop_step = np.full(len(T), config.Tmax - 1)
+        period = np.zeros(len(T), dtype=np.int64)
+    if instrument is not None:
+        instrument.begin(kernel, 'batched', N)
+    for t in range(start_step, config.Tmax):
+        s, s_old = kernel(csr, s, state.payoffs, T, S, rng, constants), s
+        if instrument is not None:
+            instrument.lap('rule')
+        state = update_payoff_state(state, csr, s_old, s, matrix)
+        if instrument is not None:
+            instrument.lap('payoff')
+        C_len = s.sum(axis=1)
+        finished = (C_len == 0) | (C_len == N)
+        p[active[finished]] = C_len[finished] == N
+        if final is not None:
+            final[active[finished]] = np.where((C_len[finished] == N)[:, np.newaxis], pack_strategies(np.ones(N)), 0)
+        if convergence is not None:
+            stationary_step[active[finished]] = stop_step[active[finished]] = t
+            stopped = ~finished & monitor.observe(t, C_len, s)
+            p[active[stopped]] = monitor.estimate[stopped]
+            stationary_step[active[stopped]] = monitor.start[stopped]
+            stop_step[active[stopped]] = t
+            period[active[stopped]] = monitor.period[stopped]
+            finished |= stopped
+        if instrument is not None:
+            instrument.step(t, int(np.count_nonzero(s != s_old)), int(C_len.sum()), s.size)
+            for absorbed in ((C_len[finished] == 0) | (C_len[finished] == N)).tolist():
+                instrument.end(t + 1 - start_step, 'absorbed' if absorbed else 'converged')
+        if finished.any():
+            keep = ~finished
+            s, C_len, active, T, S = s[keep], C_len[keep], active[keep], T[keep], S[keep]
+            matrix = matrix._replace(S=S, T=T)
+            rng = _compress_streams(rng, keep)
+            state = PayoffState(state.cooperating[keep], state.payoffs[keep])
+            constants = constants._replace(phi_scale=constants.phi_scale[keep], psi_scale=constants.psi_scale[keep])
+            if convergence is not None:
+                monitor.compress(keep)
+            if len(active) == 0:
+                break
+        if instrument is not None:
+            instrument.lap('commit')
+
+        if t >= config.Ttrans:
+            P[active] += C_len
+
+    if final is not None:
+        final[active] = pack_strategies(s)
+    if instrument is not None:
+        for _ in active:
+            instrument.end(config.Tmax - start_step, 'horizon')
+        instrument.finish()
+    if convergence is None:
+        p[active] = P[active]/(N*(config.Tmax-config.Ttrans))
+        return p
+    p[active] = monitor.P/(N*monitor.count)
+    stationary_step[active] = monitor.start
+    return SimulationReport(p, stationary_step, stop_step, period)
+
+def replica_game_simulation(G, Nrep, T, S, update_rule, rng=None, convergence=None, matrix=None, instrument=None):
+    rng = _row_streams(rng, update_rule, np.zeros(Nrep, dtype=np.int64), np.arange(Nrep))
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    return _run_rows(csr, np.full(Nrep, T), np.full(Nrep, S), update_rule, rng, convergence, matrix, instrument)
+
+def sweep_game_simulation(G, TS_list, Nrep, update_rule, rng=None, batch_size=None, convergence=None, matrix=None, instrument=None, points=None, mean=True):
+    rng = rng if isinstance(rng, np.random.Generator) else _seed_sequence(rng)
+    points = np.repeat(np.arange(len(TS_list)) if points is None else points, Nrep)
+    replicas = np.tile(np.arange(Nrep), len(TS_list))
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    T = np.repeat([ts[0] for ts in TS_list], Nrep)
+    S = np.repeat([ts[1] for ts in TS_list], Nrep)
+    if batch_size is None:
+        batch_size = max(1, 2**22 // max(len(csr.nodes), len(csr.indices), 1))
+    results = []
+    for i in range(0, len(T), batch_size):
+        rows = slice(i, i + batch_size)
+        streams = _row_streams(rng, update_rule, points[rows], replicas[rows])
+        results.append(_run_rows(csr, T[rows], S[rows], update_rule, streams, convergence, matrix, instrument))
+    if convergence is None:
+        p = np.concatenate(results).reshape(len(TS_list), Nrep)
+        return p.mean(axis=1) if mean else p
+    report = SimulationReport(*(np.concatenate(field).reshape(len(TS_list), Nrep) for field in zip(*results)))
+    return report.p.mean(axis=1), report
+
+def phase_diagram(G, update_rule, t_values, s_values, Nrep=None, rng=None, batch_size=None, matrix=None):
+    Nrep = config.Nrep if Nrep is None else Nrep
+    TS_list = [(t, s) for s in s_values for t in t_values]
+    p_list = sweep_game_simulation(G, TS_list, Nrep, update_rule, rng, batch_size, matrix=matrix)
+    return p_list.reshape(len(s_values), len(t_values))
+
+def plot_phase_diagram(G, name, update_rule, t_values, s_values, Nrep=None):
+    import matplotlib.pyplot as plt
+    grid = phase_diagram(G, update_rule, t_values, s_values, Nrep)
+    plt.figure(figsize=(8,6))
+    plt.title(name + ' : ' + update_rule.__name__)
+    plt.imshow(grid, origin='lower', aspect='auto', vmin=0, vmax=1, extent=[t_values[0], t_values[-1], s_values[0], s_values[-1]])
+    plt.colorbar(label='fraction of cooperators')
+    plt.xlabel('T')
+    plt.ylabel('S')
+    return grid
+
+"""##Parallel sweeps ✅
+
+plots() runs the update rules, the (T, S) points and the replicas one after the other on a single core. The function parallel_sweep splits the work into tasks (update rule, (T, S) point, chunk of chunk_size replicas) and runs them with replica-batched simulations on a pool of worker processes. The graph is converted to CSR once and sent to every worker when the pool starts, together with the current config (Tmax, Ttrans and d_0). The results are collected in order and returned as a dictionary with the p_list of every update rule, which is what plots() draws.
+
+The simulations do not use the global random module. Every replica has its own random stream (see the part on reproducible random streams below), derived from the master seed and the key (update rule name, index of the point, index of the replica), and every task writes the fractions of cooperators of its replicas at their place in the output. The results are therefore reproducible bit for bit for a given seed, whatever the number of workers, the chunk_size or the order in which the tasks are scheduled, and they are the same as sweep_game_simulation with the same seed. With plots(..., workers=n) the sweep of plots() runs on n processes.
+"""
+
+def _init_sweep_worker(directory, spec, simulation_config, matrix=None, master=None):
+    global _worker_csr, _worker_results, _worker_matrix, _worker_master, config
+    arrays = attach_shared(spec)
+    if directory is None:
+        _worker_csr = CSRGraph(np.arange(len(arrays['degree'])), arrays['indptr'], arrays['indices'], arrays['degree'])
+    else:
+        _worker_csr = open_csr(directory)
+    set_graph_constants(_worker_csr, GraphConstants(*(arrays[name] for name in GraphConstants._fields)))
+    _worker_results = arrays['results']
+    _worker_matrix = matrix
+    _worker_master = master
+    config = simulation_config
+
+def _sweep_task(task):
+    update_rule, T, S, point, start, n_replicas, offset = task
+    rng = replica_streams(_worker_master, update_rule, np.full(n_replicas, point), np.arange(start, start + n_replicas))
+    _worker_results[offset:offset + n_replicas] = _run_rows(_worker_csr, np.full(n_replicas, T), np.full(n_replicas, S), update_rule, rng, matrix=_worker_matrix)
+
+def _sweep_task_key(cache, fingerprint, master, matrix, task):
+    update_rule, t, s, point, start, n_replicas, _ = task
+    simulation = dict(Tmax=config.Tmax, Ttrans=config.Ttrans, d_0=config.d_0)
+    payoffs = {} if matrix is None else {'matrix': [float(matrix.R), float(matrix.P), matrix.normalization]}
+    replicas = [start, start + n_replicas]
+    spawned = {'spawn_key': list(master.spawn_key)} if master.spawn_key else {}
+    return cache.key(graph=fingerprint, rule=update_rule.__name__, T=float(t), S=float(s), seed=master.entropy, rng='replica-streams', point=point, replicas=replicas, **simulation, **payoffs, **spawned)
+
+def parallel_sweep(G, TS_list, update_rules, Nrep=None, workers=None, seed=None, chunk_size=None, cache=None, matrix=None):
+    Nrep = config.Nrep if Nrep is None else Nrep
+    chunk_size = Nrep if chunk_size is None else chunk_size
+    workers = os.cpu_count() if workers is None else workers
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    master = _seed_sequence(seed)
+    tasks = []
+    for r, update_rule in enumerate(update_rules):
+        for k, (t, s) in enumerate(TS_list):
+            for start in range(0, Nrep, chunk_size):
+                tasks.append((update_rule, t, s, k, start, min(chunk_size, Nrep - start), (r * len(TS_list) + k) * Nrep + start))
+    values = [None] * len(tasks)
+    if cache is not None:
+        fingerprint = graph_fingerprint(csr)
+        keys = [_sweep_task_key(cache, fingerprint, master, matrix, task) for task in tasks]
+        values = [cache.get(key) for key in keys]
+    p = np.zeros(len(update_rules) * len(TS_list) * Nrep)
+    for task, value in zip(tasks, values):
+        if value is not None:
+            p[task[6]:task[6] + task[5]] = value
+    pending = [i for i, value in enumerate(values) if value is None]
+    if pending:
+        directory = _csr_directory(csr)
+        arrays = dict(graph_constants(csr)._asdict(), results=p)
+        if directory is None:
+            arrays.update(indptr=csr.indptr, indices=csr.indices, degree=csr.degree)
+        with SharedArrays(arrays) as shared, ProcessPoolExecutor(workers, initializer=_init_sweep_worker, initargs=(directory, shared.spec, config, matrix, master)) as executor:
+            results = shared.arrays['results']
+            futures = {executor.submit(_sweep_task, tasks[i]): i for i in pending}
+            for future in as_completed(futures):
+                future.result()
+                i = futures[future]
+                offset, n_replicas = tasks[i][6], tasks[i][5]
+                p[offset:offset + n_replicas] = results[offset:offset + n_replicas]
+                if cache is not None:
+                    cache.put(keys[i], p[offset:offset + n_replicas].tolist())
+    p = p.reshape(len(update_rules), len(TS_list), Nrep).mean(axis=2)
+    return {update_rule.__name__: p[r] for r, update_rule in enumerate(update_rules)}
+
+"""##Persistent result cache ✅
+
+The notebook recomputes the same work several times (the same plots() calls appear with a subset of the rules and then with all of them, and again in the second game simulation section), and a crash during a sweep of several hours loses everything. parallel_sweep(..., cache=ResultCache(directory)) stores the result of every task on disk as soon as it finishes and looks the results up before computing anything, so an interrupted sweep resumes where it stopped and overlapping sweeps only compute the missing tasks.
+
+The results are content-addressed : the key of a task is a hash of the graph (graph_fingerprint hashes the CSR arrays), the update rule, T and S, Tmax, Ttrans and d_0, the master seed, the index of the point and the chunk of replicas, and the value is the list of the fractions of cooperators of these replicas. A sweep only finds earlier results when it is run with the same seed and chunk_size, since a sweep without seed draws a new master seed every time. Every result is a small file under directory, and when the cache grows beyond max_bytes the least recently used files are removed. Only parallel_sweep uses the cache, so plots and run_job raise a ValueError when cache is given without workers or together with precision instead of silently recomputing everything.
+"""
+
+def graph_fingerprint(csr):
+    digest = hashlib.sha256()
+    for array in (csr.indptr, csr.indices):
+        for start in range(0, len(array), 2**20):
+            digest.update(np.ascontiguousarray(array[start:start + 2**20], dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def key(self, **fields):
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'value': value}, f)
+        self.size -= os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        files = sorted(self._files(), key=os.path.getmtime)
+        for path in files:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+
+"""##Stationarity detection and early termination ✅
+
+The fixed Tmax and Ttrans have to be chosen for the slowest case (Tmax = 10000 and Ttrans = 9000 for the homogeneous random graphs) and are then used for every update rule and every (T, S) point, even for points that settle within 100 steps. The batched simulations can instead watch the fraction of cooperators of every replica and decide on the fly when it has become stationary. The monitor is configured with a Convergence(window, tolerance, max_period) :
+- While a replica is in the transient phase, the mean fraction of cooperators of the last window steps is compared with the mean of the window before. When they differ by less than tolerance and by less than twice the standard error of the difference (computed from the variances of the two windows) the replica is considered stationary and starts averaging from the next step. A replica that is still in the transient phase at Ttrans starts averaging at Ttrans, as without the monitor.
+- While averaging, after each block of window steps the mean of the last block is compared with the mean of all the previous averaging steps, with the same test. Once it passes, and the replica has been averaging for at least as many steps as its transient phase lasted, the estimate is considered stable and the replica stops.
+
+A fixed tolerance alone is not enough : a replica that drifts slowly towards an absorbing state (e.g. replicator_rule on watts_strogatz_csr(300, 4, 0.1) at T = 1.1 and S = 0.5, which goes from 0.95 to 1 over a thousand steps) changes by less than the tolerance between two windows, and was stopped at 0.95 - 0.98 while the fixed horizon gives 1. The standard error makes the test stricter when the fraction of cooperators barely fluctuates, so that a slow but steady change is seen as a trend, and the minimal averaging length keeps the replicas that are still drifting when they pass the test running long enough to reach the absorbing state. A replica that stays on a metastable plateau for much longer than its transient (a few thousand steps) can still be stopped there.
+- For deterministic rules (unconditional_imitation_rule), the state of every replica is hashed at each step and compared with the max_period previous states. When the state repeats, the dynamics is in a cycle (a fixed point is a cycle of period 1), the replica stops and its value is the mean fraction of cooperators over the cycle.
+
+With convergence=Convergence(...), replica_game_simulation returns a SimulationReport with the fraction of cooperators p of every replica, the step where it became stationary, the step where it stopped and the period of the cycle (0 if none). Comparing stop_step with Tmax gives the time saved against the fixed-horizon results. sweep_game_simulation returns the p_list together with the report of all the points, and MC(..., backend='batched', convergence=...) returns the mean as before. The monitor only exists in the batched simulations, so MC with another backend or with precision, and run_job with workers or precision, raise a ValueError when convergence is given.
+"""
+
+Convergence = namedtuple('Convergence', ['window', 'tolerance', 'max_period'], defaults=[100, 0.01, 64])
+SimulationReport = namedtuple('SimulationReport', ['p', 'stationary_step', 'stop_step', 'period'])
+
+deterministic_kernels = {unconditional_imitation_kernel}
+
+class StationarityMonitor:
+    def __init__(self, convergence, n_rows, N, deterministic=False):
+        self.window, self.tolerance, self.max_period = convergence
+        self.N = N
+        self.deterministic = deterministic and self.max_period > 0
+        self.history = np.zeros((n_rows, max(2 * self.window, self.max_period + 1)))
+        self.hashes = np.zeros((n_rows, self.max_period + 1), dtype=np.int64)
+        self.averaging = np.zeros(n_rows, dtype=bool)
+        self.start = np.full(n_rows, config.Ttrans)
+        self.P = np.zeros(n_rows)
+        self.count = np.zeros(n_rows, dtype=np.int64)
+        self.block = np.zeros(n_rows)
+        self.P2 = np.zeros(n_rows)
+        self.block2 = np.zeros(n_rows)
+        self.period = np.zeros(n_rows, dtype=np.int64)
+        self.estimate = np.zeros(n_rows)
+
+    def observe(self, t, C_len, s):
+        w, H = self.window, self.history.shape[1]
+        self.history[:, t % H] = C_len / self.N
+        stopped = np.zeros(len(C_len), dtype=bool)
+
+        if self.deterministic:
+            h = np.array([hash(row.tobytes()) for row in pack_strategies(s)], dtype=np.int64)
+            lags = np.arange(1, min(self.max_period, t) + 1)
+            match = self.hashes[:, (t - lags) % (self.max_period + 1)] == h[:, np.newaxis]
+            self.hashes[:, t % (self.max_period + 1)] = h
+            for i in np.nonzero(match.any(axis=1))[0]:
+                period = lags[match[i].argmax()]
+                self.period[i] = period
+                self.start[i] = t - period
+                self.estimate[i] = self.history[i, (t - np.arange(period)) % H].mean()
+                stopped[i] = True
+
+        averaging = self.averaging & ~stopped
+        x = C_len[averaging] / self.N
+        self.P[averaging] += C_len[averaging]
+        self.block[averaging] += C_len[averaging]
+        self.P2[averaging] += x ** 2
+        self.block2[averaging] += x ** 2
+        self.count[averaging] += 1
+        boundary = averaging & (self.count % w == 0)
+        if boundary.any():
+            check = boundary & (self.count >= np.maximum(2 * w, self.start))
+            n = np.maximum(self.count - w, 1)
+            recent = self.block / (self.N * w)
+            previous = (self.P - self.block) / (self.N * n)
+            variance = np.maximum(self.block2 / w - recent ** 2, 0) / w + np.maximum((self.P2 - self.block2) / n - previous ** 2, 0) / n
+            stable = check & self.settled(recent - previous, variance)
+            self.estimate[stable] = self.P[stable] / (self.N * self.count[stable])
+            stopped |= stable
+            self.block[boundary] = 0
+            self.block2[boundary] = 0
+
+        transient = ~self.averaging & ~stopped
+        if t + 1 >= config.Ttrans:
+            fire = transient
+        elif (t + 1) % w == 0 and t + 1 >= 2 * w:
+            recent = self.history[:, (t - np.arange(w)) % H]
+            older = self.history[:, (t - w - np.arange(w)) % H]
+            variance = (recent.var(axis=1) + older.var(axis=1)) / w
+            fire = transient & self.settled(recent.mean(axis=1) - older.mean(axis=1), variance)
+        else:
+            fire = np.zeros(len(C_len), dtype=bool)
+        self.averaging |= fire
+        self.start[fire] = t + 1
+        return stopped
+
+    def settled(self, difference, variance):
+        return np.abs(difference) <= np.minimum(self.tolerance, 2 * np.sqrt(variance))
+
+    def compress(self, keep):
+        for name in ['history', 'hashes', 'averaging', 'start', 'P', 'count', 'block', 'P2', 'block2', 'period', 'estimate']:
+            setattr(self, name, getattr(self, name)[keep])
+
+"""##Fast random graph generators ✅
+
+ER_Gnk builds the list of all the N(N-1)/2 pairs of nodes for every edge it adds, so it costs O(K N^2) and does not work beyond a few thousand nodes, and generate_community_network copies the whole graph with nx.disjoint_union for every community. The generators below draw the edges directly as numpy arrays of endpoints and return a CSRGraph (built with csr_from_edges), in roughly O(N + E) time and memory. They all take a seed (an integer or a numpy random generator).
+
+- er_gnk_csr(N, K) : Erdos-Renyi graph with exactly K edges chosen uniformly among all the pairs. The pairs are drawn as random indices in the list of all pairs (without building it) and duplicates are redrawn.
+- watts_strogatz_csr(N, k, p) : ring lattice where every node is connected to its k nearest neighbors, and every edge is rewired to a random node with probability p (self-loops and duplicate edges are redrawn).
+- community_csr(N, k, p_in, p_out, num_communities) : the graph of generate_community_network, num_communities Watts-Strogatz blocks of N // num_communities nodes, and for every pair of blocks one random edge between them with probability p_out.
+- sbm_csr(sizes, p_matrix) : stochastic block model, the number of edges between two blocks is drawn from the binomial distribution and the edges are then drawn as in er_gnk_csr.
+- random_regular_csr(d, N) : random d-regular graph. The d stubs of every node are paired at random and the few self-loops and duplicate edges are removed by swapping endpoints with random edges, which keeps all the degrees equal to d. When the swaps have not removed them after max_rounds rounds the pairing starts again. For dense graphs (2d > N - 1), where most pairings have many duplicates and the swaps stop converging, it returns the complement of a random (N - 1 - d)-regular graph instead, which has d = N - 1 - (N - 1 - d) neighbors per node. N d must be even and 0 <= d < N.
+
+nx_graph converts a CSRGraph back to networkx when we want to draw it, and ER_Gnk and generate_community_network now use the fast generators.
+"""
+
+def _duplicated(keys):
+    order = np.argsort(keys)
+    duplicated = np.zeros(len(keys), dtype=bool)
+    duplicated[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+    return duplicated
+
+def _sample_distinct(M, m, rng):
+    if m > M:
+        raise ValueError(f'cannot draw {m} distinct values out of {M}')
+    if 2 * m > M:
+        return rng.choice(M, m, replace=False)
+    values = np.empty(0, dtype=np.int64)
+    while len(values) < m:
+        values = np.sort(np.concatenate([values, rng.integers(0, M, 2 * (m - len(values)) + 16)]))
+        values = values[np.concatenate([[True], values[1:] != values[:-1]])]
+    return rng.choice(values, m, replace=False)
+
+def _pairs_from_index(x):
+    # x enumerates the pairs (c, r) with c < r in the order (0,1), (0,2), (1,2), (0,3), ...
+    x = np.asarray(x, dtype=np.int64)
+    r = np.floor((1 + np.sqrt(1 + 8 * x.astype(np.float64))) / 2).astype(np.int64)
+    r -= r * (r - 1) // 2 > x
+    r += (r + 1) * r // 2 <= x
+    return x - r * (r - 1) // 2, r
+
+def _er_gnk_edges(N, K, rng):
+    return _pairs_from_index(_sample_distinct(N * (N - 1) // 2, int(K), rng))
+
+def _watts_strogatz_edges(N, k, p, rng):
+    u = np.tile(np.arange(N), k // 2)
+    v = (u + np.repeat(np.arange(1, k // 2 + 1), N)) % N
+    rewire = rng.random(len(u)) < p
+    rewired = rewire.copy()
+    while rewire.any():
+        v[rewire] = rng.integers(0, N, rewire.sum())
+        keys = np.minimum(u, v) * N + np.maximum(u, v)
+        # among duplicates the lattice edges come first, so only rewired edges are redrawn
+        order = np.argsort(2 * keys + rewired)
+        duplicated = np.zeros(len(keys), dtype=bool)
+        duplicated[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+        rewire = (u == v) | duplicated
+    return u, v
+
+def _random_regular_edges(d, N, rng, max_rounds=100):
+    if (N * d) % 2 != 0 or not 0 <= d < N:
+        raise ValueError('N * d must be even and 0 <= d < N')
+    if 2 * d > N - 1:
+        u, v = _random_regular_edges(N - 1 - d, N, rng, max_rounds)
+        adjacency = np.eye(N, dtype=bool)
+        adjacency[u, v] = adjacency[v, u] = True
+        return np.nonzero(np.triu(~adjacency, 1))
+    while True:
+        stubs = rng.permutation(np.repeat(np.arange(N), d))
+        u, v = stubs[0::2].copy(), stubs[1::2].copy()
+        for _ in range(max_rounds):
+            bad = np.nonzero((u == v) | _duplicated(np.minimum(u, v) * N + np.maximum(u, v)))[0]
+            if len(bad) == 0:
+                return u, v
+            for i, j in zip(bad, rng.integers(0, len(u), len(bad))):
+                v[i], u[j] = u[j], v[i]
+
+def er_gnk_csr(N, K, seed=None):
+    rng = np.random.default_rng(seed)
+    return csr_from_edges(N, *_er_gnk_edges(N, K, rng))
+
+def watts_strogatz_csr(N, k, p, seed=None):
+    rng = np.random.default_rng(seed)
+    return csr_from_edges(N, *_watts_strogatz_edges(N, k, p, rng))
+
+def community_csr(N, k, p_in, p_out, num_communities, seed=None):
+    rng = np.random.default_rng(seed)
+    n = N // num_communities
+    blocks = [_watts_strogatz_edges(n, k, p_in, rng) for _ in range(num_communities)]
+    u = [block[0] + c * n for c, block in enumerate(blocks)]
+    v = [block[1] + c * n for c, block in enumerate(blocks)]
+    a, b = np.triu_indices(num_communities, 1)
+    linked = rng.random(len(a)) < p_out
+    u.append(a[linked] * n + rng.integers(0, n, linked.sum()))
+    v.append(b[linked] * n + rng.integers(0, n, linked.sum()))
+    return csr_from_edges(n * num_communities, np.concatenate(u), np.concatenate(v))
+
+def sbm_csr(sizes, p_matrix, seed=None):
+    rng = np.random.default_rng(seed)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    u, v = [], []
+    for a in range(len(sizes)):
+        for b in range(a, len(sizes)):
+            if a == b:
+                pairs = sizes[a] * (sizes[a] - 1) // 2
+                x, y = _pairs_from_index(_sample_distinct(pairs, rng.binomial(pairs, p_matrix[a][b]), rng))
+            else:
+                pairs = sizes[a] * sizes[b]
+                x, y = np.divmod(_sample_distinct(pairs, rng.binomial(pairs, p_matrix[a][b]), rng), sizes[b])
+            u.append(x + offsets[a])
+            v.append(y + offsets[b])
+    return csr_from_edges(offsets[-1], np.concatenate(u), np.concatenate(v))
+
+def random_regular_csr(d, N, seed=None):
+    rng = np.random.default_rng(seed)
+    return csr_from_edges(N, *_random_regular_edges(d, N, rng))
+
+def nx_graph(csr):
+    import networkx as nx
+    G = nx.Graph()
+    G.add_nodes_from(range(len(csr.degree)))
+    sources = _edge_sources(csr)
+    upper = sources < csr.indices
+    G.add_edges_from(zip(sources[upper].tolist(), csr.indices[upper].tolist()))
     return G
 
-"""##  ▶ First experiment : Complete graphs"""
+"""##Well-mixed and equivalence class fast path ✅
 
-complete_graph_100 = nx.complete_graph(100)
+On the complete graph every cooperator has the same payoff and every defector has the same payoff, both only depend on the number of cooperators, and still every step walks all the 4950 edges of complete_graph_100. More generally, when the nodes can be split into classes such that every node of a class is connected either to all or to none of the nodes of another class (the complete graph has one class, a complete bipartite graph or a star have two), the state of the game is fully described by the number of cooperators c_a of every class a.
 
-nx.draw(complete_graph_100, with_labels=True)
+class_game_simulation(sizes, block, Nrep, T, S, update_rule) simulates such a graph, with the number of nodes of every class in sizes and block[a][b] = 1 when the nodes of class a are connected to the nodes of class b (block[a][a] = 1 means that the nodes of class a form a clique). For every class and strategy it computes the payoff, the composition of the neighborhood and, from the update rule, the probability that a node of this class and strategy cooperates at the next step. Since the nodes update independently, the new number of cooperators of every class is the sum of two binomial draws. A step costs O(number of classes^2) instead of O(E), for all the replicas at once, and the initial defectors are drawn with the multivariate hypergeometric distribution. well_mixed_game_simulation(N, Nrep, T, S, update_rule) is the complete graph with one class.
 
-"""##Results using the first game simulation defined
+The transition probabilities reproduce the per-node rules. The only choices that depend on the order of the nodes (the neighbor with the highest payoff for stochastic_best_response_rule, the first neighbor that passes its draw for multiple_replicator_rule and the node with the highest payoff for unconditional_imitation_rule) are made as if the nodes were labelled at random, which is exact on the complete graph where the result does not depend on the order. replica_game_simulation, sweep_game_simulation and the parallel sweeps use this path automatically on complete graphs, with or without an instrument (it reports to it under the engine name 'classes'). Only a convergence monitor, which needs the strategy of every node to detect cycles, makes them step through the nodes instead.
+"""
+
+class_rules = [random_rule, stochastic_best_response_rule, generous_tit_for_tat_rule, replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule, fermi_rule]
+
+_gauss_u, _gauss_w = np.polynomial.legendre.leggauss(64)
+_gauss_u, _gauss_w = (_gauss_u + 1) / 2, _gauss_w / 2
+
+def _class_cooperation_probabilities(update_rule, n, A, c, T, S, rng, matrix):
+    # arrays of shape (rows, a, x, b, y) : node of class a with strategy x, neighbor of class b with strategy y
+    K = len(n)
+    x = np.arange(2)
+    counts = np.stack([n - c, c], axis=-1)
+    self_pair = (np.eye(K)[:, np.newaxis, :, np.newaxis] * np.eye(2)[np.newaxis, :, np.newaxis, :]) * A.diagonal()[:, np.newaxis, np.newaxis, np.newaxis]
+    m = np.maximum(A[:, np.newaxis, :, np.newaxis] * counts[:, np.newaxis, np.newaxis, :, :] - self_pair, 0)
+    k = (A * n).sum(axis=1) - A.diagonal()
+    k_a = k[:, np.newaxis]
+    coop = m[..., 1].sum(axis=-1)
+    pay = _payoffs_from_counts(k_a, x, coop, matrix)
+    pay_self = pay[..., np.newaxis, np.newaxis]
+    pay_neighbor = pay[:, np.newaxis, np.newaxis, :, :]
+    diff = pay_neighbor - pay_self
+    present = counts > 0
+    has = (k_a > 0)[np.newaxis, :, :]
+
+    if update_rule is random_rule:
+        return np.full(pay.shape, 0.5)
+
+    if update_rule is unconditional_imitation_rule:
+        best = np.where(present, pay, -np.inf).max(axis=(1, 2))[:, np.newaxis, np.newaxis]
+        tied = present & (pay == best)
+        weights = (counts * tied).reshape(len(c), -1)
+        u = rng.random(len(c))[:, np.newaxis] * weights.sum(axis=1, keepdims=True)
+        chosen = (np.cumsum(weights, axis=1) <= u).sum(axis=1)
+        strategy = (chosen % 2)[:, np.newaxis, np.newaxis]
+        return np.where(pay < best, strategy, x).astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        w = m / np.maximum(k, 1)[:, np.newaxis, np.newaxis, np.newaxis]
+        if update_rule is generous_tit_for_tat_rule:
+            probability = (diff > 0) * 0.8
+        elif update_rule is replicator_rule:
+            phi = _degree_scale(np.maximum(k[:, np.newaxis], k[np.newaxis, :]), matrix)[:, np.newaxis, :, np.newaxis] * _phi_scale(T, S, matrix)[..., np.newaxis, np.newaxis]
+            probability = (diff > 0) * np.clip(diff / phi, 0, 1)
+        elif update_rule is fermi_rule:
+            probability = 1/(1+np.exp(-0.1*diff))
+        elif update_rule is moran_rule:
+            reachable = (A * (n - np.eye(K, dtype=n.dtype)) > 0)
+            psi = _degree_scale(np.maximum(k, np.where(reachable, k[np.newaxis, :], 0).max(axis=1)), matrix)[:, np.newaxis] * _psi_scale(T, S, matrix)
+            total = (m * pay_neighbor).sum(axis=(-2, -1)) + pay - (k_a + 1) * psi
+            probability = np.nan_to_num(np.clip((pay_neighbor - psi[..., np.newaxis, np.newaxis]) / total[..., np.newaxis, np.newaxis], 0, 1))
+        elif update_rule is stochastic_best_response_rule:
+            visible = m > 0
+            best = np.where(visible, pay_neighbor, -np.inf).max(axis=(-2, -1))
+            tied = m * (visible & (pay_neighbor == best[..., np.newaxis, np.newaxis]))
+            share = tied.sum(axis=-2) / tied.sum(axis=(-2, -1))[..., np.newaxis]
+            pmax = np.where(present, pay, -np.inf).max(axis=(1, 2))[:, np.newaxis, np.newaxis]
+            adopt = np.nan_to_num(share * np.clip((best - pay) / pmax, 0, 1)[..., np.newaxis]) * has[..., np.newaxis] * (pmax > 0)[..., np.newaxis]
+            return np.where(x == 1, 1 - adopt[..., 0], adopt[..., 1])
+        elif update_rule is multiple_replicator_rule:
+            phi = _degree_scale(np.maximum(k[:, np.newaxis], k[np.newaxis, :]), matrix)[:, np.newaxis, :, np.newaxis] * _phi_scale(T, S, matrix)[..., np.newaxis, np.newaxis]
+            q = (diff > 0) * np.clip(diff / phi, 0, 1)
+            any_success = 1 - np.prod((1 - q) ** m, axis=(-2, -1))
+            # probability that the first success in a random order of the neighbors has strategy y
+            u = _gauss_u
+            log_none = (m[..., np.newaxis] * np.log1p(-q[..., np.newaxis] * u)).sum(axis=(-3, -2), keepdims=True)
+            rate = m[..., np.newaxis] * q[..., np.newaxis] / (1 - q[..., np.newaxis] * u)
+            first = (rate * np.exp(log_none)).sum(axis=-3) @ _gauss_w
+            share = np.nan_to_num(first / first.sum(axis=-1, keepdims=True))
+            adopt = any_success[..., np.newaxis] * share
+            return np.where(x == 1, 1 - adopt[..., 0], adopt[..., 1])
+        else:
+            raise ValueError(f'{update_rule.__name__} has no class transition probabilities')
+        adopt = (w * probability).sum(axis=-2) * has[..., np.newaxis]
+    if update_rule is generous_tit_for_tat_rule:
+        return np.broadcast_to(1 - adopt[..., 0], pay.shape)
+    return np.where(x == 1, 1 - adopt[..., 0], adopt[..., 1])
+
+def _simulate_classes(sizes, block, T, S, update_rule, rng, matrix=None, instrument=None):
+    n = np.asarray(sizes, dtype=np.int64)
+    A = np.asarray(block, dtype=np.int64)
+    N = n.sum()
+    T = np.asarray(T, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    S = np.asarray(S, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    matrix = _payoff_matrix(T, S, matrix)
+    c = n - rng.multivariate_hypergeometric(n, round(config.d_0 * N), size=len(T))
+    p = np.zeros(len(T))
+    P = np.zeros(len(T))
+    active = np.arange(len(T))
+    if instrument is not None:
+        instrument.begin(update_rule, 'classes', N)
+    for t in range(0, config.Tmax):
+        probability = np.clip(_class_cooperation_probabilities(update_rule, n, A, c, T, S, rng, matrix), 0, 1)
+        if instrument is not None:
+            instrument.lap('rule')
+        stay, join = rng.binomial(c, probability[..., 1]), rng.binomial(n - c, probability[..., 0])
+        c, c_old = stay + join, c
+        C_len = c.sum(axis=1)
+        finished = (C_len == 0) | (C_len == N)
+        if instrument is not None:
+            instrument.lap('commit')
+            instrument.step(t, int((c_old - stay + join).sum()), int(C_len.sum()), len(C_len) * int(N))
+            for _ in range(np.count_nonzero(finished)):
+                instrument.end(t + 1, 'absorbed')
+        if finished.any():
+            p[active[finished]] = C_len[finished] == N
+            keep = ~finished
+            c, C_len, active, T, S = c[keep], C_len[keep], active[keep], T[keep], S[keep]
+            matrix = matrix._replace(S=S, T=T)
+            rng = _compress_streams(rng, keep)
+            if len(active) == 0:
+                break
+        if instrument is not None:
+            instrument.lap('commit')
+
+        if t >= config.Ttrans:
+            P[active] += C_len
+
+    p[active] = P[active]/(N*(config.Tmax-config.Ttrans))
+    if instrument is not None:
+        for _ in active:
+            instrument.end(config.Tmax, 'horizon')
+        instrument.finish()
+    return p
+
+def class_game_simulation(sizes, block, Nrep, T, S, update_rule, rng=None, matrix=None):
+    rng = np.random.default_rng() if rng is None else rng
+    return _simulate_classes(sizes, block, np.full(Nrep, T), np.full(Nrep, S), update_rule, rng, matrix)
+
+def well_mixed_game_simulation(N, Nrep, T, S, update_rule, rng=None, matrix=None):
+    return class_game_simulation([N], [[1]], Nrep, T, S, update_rule, rng, matrix)
+
+def _is_complete(csr):
+    N = len(csr.degree)
+    return len(csr.indices) == N * (N - 1) and (csr.degree == N - 1).all() and (graph_constants(csr).edge_sources != csr.indices).all()
+
+def _run_rows(csr, T, S, update_rule, rng, convergence=None, matrix=None, instrument=None):
+    if convergence is None and update_rule in class_rules and _is_complete(csr):
+        return _simulate_classes([len(csr.degree)], [[1]], T, S, update_rule, rng, matrix, instrument)
+    return _simulate_rows(csr, T, S, rule_kernels.get(update_rule, update_rule), rng, convergence, matrix, instrument=instrument)
+
+"""##Precomputed rule constants ✅
+
+The update rules repeat the same work at every call. replicator_rule and multiple_replicator_rule call G.degree(j) and recompute phi = max(ki,kj)*(max(1,T) - min(0,S)) for every candidate (the T, S factor is now computed once per call with _phi_scale), moran_rule walks all the neighbors to find the maximum degree psi and then builds a list to sum it, every rule rebuilds list(G.neighbors(i)), and stochastic_best_response_rule computes max(payoffs) over the whole population for every node, which makes one step O(N^2). None of this depends on the node being updated, so it is now computed once :
+- node_constants(G) holds the neighbor lists, the degrees and the maximum degree in the closed neighborhood of every node (max(ki, kj for j neighbor of i), the factor of psi in moran_rule). It is built once per graph and cached (game_simulation rebuilds it at the start of every run in case the graph changed), and the per-node rules read from it.
+- game_simulation passes the payoffs of a step as a Payoffs list, which computes the maximum and the position of the maximum only once per step. payoff_max and payoff_argmax return them (and fall back to max and np.argmax for a plain list), and stochastic_best_response_rule and unconditional_imitation_rule use them.
+- For the kernels, rule_constants(csr, T, S) holds the sources of the edges, max(ki, kj) for every edge (the per-edge phi is this times phi_scale), the neighborhood maximum degree and the payoff factors phi_scale and psi_scale (max(1, T) - min(0, S) and min(0, S) for the default matrix), with one value per row when T and S are batched. The array simulations build it once per run and pass it to the kernels. The part that only depends on the graph is computed by graph_constants(csr) once per CSR arrays and cached until they are deleted.
+"""
+
+NodeConstants = namedtuple('NodeConstants', ['neighbors', 'degree', 'neighbor_max_degree'])
+
+_node_constants = weakref.WeakKeyDictionary()
+
+def node_constants(G, refresh=False):
+    constants = None if refresh else _node_constants.get(G)
+    if constants is None:
+        neighbors = {n: list(G.neighbors(n)) for n in G.nodes()}
+        degree = {n: len(Ni) for n, Ni in neighbors.items()}
+        neighbor_max_degree = {n: max([degree[n]] + [degree[j] for j in Ni]) for n, Ni in neighbors.items()}
+        constants = NodeConstants(neighbors, degree, neighbor_max_degree)
+        _node_constants[G] = constants
+    return constants
+
+class Payoffs(list):
+    _max = None
+    _argmax = None
+
+    def __init__(self, values=(), random=None, matrix=None):
+        super().__init__(values)
+        self.random = BlockRandom() if random is None else random
+        self.matrix = matrix
+
+    def __setitem__(self, index, value):
+        old = self[index]
+        if self._max is not None:
+            if value > self._max:
+                self._max = value
+            elif value < old == self._max:
+                self._max = None
+        if self._argmax is not None:
+            best = self[self._argmax]
+            if index == self._argmax:
+                if value < best:
+                    self._argmax = None
+            elif value > best or (value == best and index < self._argmax):
+                self._argmax = index
+        super().__setitem__(index, value)
+
+    def max(self):
+        if self._max is None:
+            self._max = max(self)
+        return self._max
+
+    def argmax(self):
+        if self._argmax is None:
+            self._argmax = int(np.argmax(self))
+        return self._argmax
+
+def as_payoffs(payoffs):
+    return payoffs if isinstance(payoffs, Payoffs) else Payoffs(payoffs)
+
+def payoff_max(payoffs):
+    return payoffs.max() if isinstance(payoffs, Payoffs) else max(payoffs)
+
+def payoff_argmax(payoffs):
+    return payoffs.argmax() if isinstance(payoffs, Payoffs) else np.argmax(payoffs)
+
+GraphConstants = namedtuple('GraphConstants', ['edge_sources', 'edge_max_degree', 'neighbor_max_degree'])
+RuleConstants = namedtuple('RuleConstants', GraphConstants._fields + ('degree', 'phi_scale', 'psi_scale'))
+
+_graph_constants = {}
+
+def set_graph_constants(csr, constants):
+    key = id(csr.indices)
+    if key not in _graph_constants:
+        weakref.finalize(csr.indices, _graph_constants.pop, key, None)
+    _graph_constants[key] = constants
+    return constants
+
+def graph_constants(csr):
+    constants = _graph_constants.get(id(csr.indices))
+    if constants is None:
+        sources = _edge_sources(csr)
+        edge_max_degree = np.maximum(csr.degree[sources], csr.degree[csr.indices])
+        neighbor_max_degree = np.maximum(csr.degree, _segment_reduce(np.maximum, csr.degree[csr.indices], csr, 0))
+        constants = set_graph_constants(csr, GraphConstants(sources, edge_max_degree, neighbor_max_degree))
+    return constants
+
+def rule_constants(csr, T, S, matrix=None):
+    constants, degree = graph_constants(csr), csr.degree
+    if matrix is not None and matrix.normalization != 'accumulated':
+        constants = constants._replace(edge_max_degree=np.ones_like(constants.edge_max_degree), neighbor_max_degree=np.ones_like(constants.neighbor_max_degree))
+        degree = np.ones_like(degree)
+    return RuleConstants(*constants, degree, _phi_scale(T, S, matrix), _psi_scale(T, S, matrix))
+
+"""##Compact strategy state ✅
+
+The strategies used to be Python sets of node ids (C, new_C and new_D in game_simulation, H in the snowdrift simulation), and every step rebuilt C = (C | new_C) - new_D, allocating new sets and hashing node ids in the innermost loops, at about 50-70 bytes per cooperator. The simulations now keep one byte per node in a StrategyArray : values is a uint8 numpy array (1 for cooperators, or hawks) that the vectorized code uses directly, and the object also behaves like the old set for the per-node functions (j in C, len(C) and iteration over the cooperators), so the update rules and payoff_node did not change. The membership test reads a bytearray that shares its memory with values, which is as fast as the set lookup. The decisions of a step are written into a small int8 array and applied in place with two masked writes.
+
+For storing and comparing states, pack_strategies packs the strategies into bits (8 nodes per byte, along the last axis) and unpack_strategies restores them. The stationarity monitor now hashes the packed states, and the batched simulations take their initial strategies and return their final strategies in this form (initial and final of _simulate_rows), so annealed_sweep keeps the states of all its replicas between two points in N / 8 bytes per replica. The simulations themselves keep one byte per node while they run, which the kernels and the per-node rules read directly.
+"""
+
+class StrategyArray:
+    def __init__(self, nodes, cooperating=1):
+        self.nodes = nodes
+        self.position = None if nodes == list(range(len(nodes))) else {n: i for i, n in enumerate(nodes)}
+        self.bytes = bytearray([cooperating]) * len(nodes)
+        self.values = np.frombuffer(self.bytes, dtype=np.uint8)
+
+    def __contains__(self, n):
+        return self.bytes[n if self.position is None else self.position[n]] == 1
+
+    def __len__(self):
+        return int(np.count_nonzero(self.values))
+
+    def __iter__(self):
+        return (self.nodes[i] for i in np.flatnonzero(self.values))
+
+def pack_strategies(s):
+    return np.packbits(np.asarray(s, dtype=np.uint8), axis=-1)
+
+def unpack_strategies(packed, N):
+    return np.unpackbits(packed, axis=-1, count=N)
+
+"""##Loading large real-world networks from edge lists ✅
+
+The only real network of the experiments is the karate club, which is built in memory by networkx. Real networks with tens of millions of edges do not fit in a networkx graph, so load_edge_list reads an edge list from disk and builds the CSR arrays on disk, without networkx and without holding the whole edge list in memory :
+- The file is read in chunks of chunk_edges edges. A text file has one edge per line ('u v', with any whitespace or the given delimiter, lines starting with # or % are comments and any column after the second one, like a weight, is ignored, so the lines can have different numbers of columns ; the ids are parsed as floats, which is exact up to 2^53). A binary file (dtype='int32' or 'int64') is a flat array of pairs of node ids and is read through a memory map.
+- A first pass counts the degree of every node, which gives indptr. A second pass writes every edge in both directions at its place in indices. Then the neighbors of every node are sorted and the self-loops and duplicate edges are removed, in blocks of rows.
+- The node ids must be integers. With relabel=False the nodes are 0..max id (ids that never appear become isolated nodes), with relabel=True only the ids that appear are kept, numbered in increasing order, and nodes holds the original ids.
+
+The arrays are saved as .npy files in a cache directory (by default the name of the file followed by .csr) together with a meta.json describing the source file (size and modification time), which is written last. On the next runs, if the source did not change, load_edge_list does not parse anything and open_csr memory-maps the saved arrays, so the graph is available immediately and the operating system loads only the pages that are used. The worker processes of parallel_sweep open the same files instead of receiving a copy of the arrays, so they all share one copy in the page cache.
+"""
+
+def _edge_chunks(path, chunk_edges, dtype=None, delimiter=None):
+    if dtype is not None:
+        pairs = np.memmap(path, dtype=dtype, mode='r')
+        pairs = pairs[:len(pairs) // 2 * 2].reshape(-1, 2)
+        for a in range(0, len(pairs), chunk_edges):
+            yield np.asarray(pairs[a:a + chunk_edges], dtype=np.int64)
+        return
+    delimiter = None if delimiter is None else delimiter.encode()
+    with open(path, 'rb') as f:
+        while True:
+            lines = f.readlines(16 * chunk_edges)
+            if not lines:
+                return
+            pairs = [line.split(delimiter, 2)[:2] for line in lines if line.strip() and line.lstrip()[:1] not in b'#%']
+            if pairs:
+                yield np.array(pairs, dtype=np.float64).astype(np.int64)
+
+def _edge_source(path, dtype, relabel, delimiter):
+    status = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': status.st_size, 'mtime': status.st_mtime_ns,
+            'dtype': None if dtype is None else np.dtype(dtype).name, 'relabel': relabel, 'delimiter': delimiter}
+
+def build_csr_file(path, directory, dtype=None, relabel=False, delimiter=None, chunk_edges=2**22):
+    chunks = lambda: _edge_chunks(path, chunk_edges, dtype, delimiter)
+    os.makedirs(directory, exist_ok=True)
+    meta = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta):
+        os.remove(meta)
+
+    counts = np.zeros(0, dtype=np.int64)
+    for edges in chunks():
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        if len(edges) == 0:
+            continue
+        if edges.min() < 0:
+            raise ValueError('node ids must be non-negative integers')
+        n = int(edges.max()) + 1
+        if n > len(counts):
+            counts = np.concatenate([counts, np.zeros(max(n, 2 * len(counts)) - len(counts), dtype=np.int64)])
+        counts += np.bincount(edges.ravel(), minlength=len(counts))
+    present = np.flatnonzero(counts)
+    counts = counts[:present[-1] + 1 if len(present) else 0]
+    mapping = None
+    if relabel:
+        mapping = np.full(len(counts), -1, dtype=np.int64)
+        mapping[present] = np.arange(len(present))
+        counts = counts[present]
+        np.save(os.path.join(directory, 'nodes.npy'), present)
+    elif os.path.exists(os.path.join(directory, 'nodes.npy')):
+        os.remove(os.path.join(directory, 'nodes.npy'))
+    N = len(counts)
+
+    indptr = np.lib.format.open_memmap(os.path.join(directory, 'indptr.npy'), mode='w+', dtype=np.int64, shape=(N + 1,))
+    indptr[0] = 0
+    np.cumsum(counts, out=indptr[1:])
+    unsorted = os.path.join(directory, 'indices.tmp.npy')
+    indices = np.lib.format.open_memmap(unsorted, mode='w+', dtype=_index_dtype(N), shape=(int(indptr[-1]),))
+    fill = np.array(indptr[:-1])
+    for edges in chunks():
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        if mapping is not None:
+            edges = mapping[edges]
+        src = np.concatenate([edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], edges[:, 0]])
+        order = np.argsort(src, kind='stable')
+        src, dst = src[order], dst[order]
+        first = np.flatnonzero(np.r_[True, src[1:] != src[:-1]]) if len(src) else np.zeros(0, dtype=np.int64)
+        lengths = np.diff(np.r_[first, len(src)])
+        indices[fill[src] + np.arange(len(src)) - np.repeat(first, lengths)] = dst
+        fill[src[first]] += lengths
+
+    degree = np.zeros(N, dtype=np.int64)
+    row = write = 0
+    while row < N:
+        end = max(int(np.searchsorted(indptr, indptr[row] + chunk_edges, side='right')) - 1, row + 1)
+        keys = np.repeat(np.arange(end - row, dtype=np.int64), counts[row:end]) * N + indices[indptr[row]:indptr[end]]
+        keys.sort()
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+        indices[write:write + len(keys)] = keys % N
+        degree[row:end] = np.bincount(keys // N, minlength=end - row)
+        write += len(keys)
+        row = end
+    np.cumsum(degree, out=indptr[1:])
+    indptr.flush()
+    np.save(os.path.join(directory, 'degree.npy'), degree)
+
+    final = np.lib.format.open_memmap(os.path.join(directory, 'indices.npy'), mode='w+', dtype=indices.dtype, shape=(write,))
+    for a in range(0, write, chunk_edges):
+        final[a:a + chunk_edges] = indices[a:min(a + chunk_edges, write)]
+    final.flush()
+    del indices, final
+    os.remove(unsorted)
+
+    with open(meta, 'w') as f:
+        json.dump(dict(_edge_source(path, dtype, relabel, delimiter), N=N, E=write // 2), f)
+    return open_csr(directory)
+
+def open_csr(directory):
+    indptr, indices, degree = (np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in ['indptr', 'indices', 'degree'])
+    nodes = os.path.join(directory, 'nodes.npy')
+    nodes = np.load(nodes, mmap_mode='r') if os.path.exists(nodes) else np.arange(len(degree))
+    return CSRGraph(nodes, indptr, indices, degree)
+
+def load_edge_list(path, directory=None, dtype=None, relabel=False, delimiter=None, chunk_edges=2**22):
+    directory = directory or str(path) + '.csr'
+    meta = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta):
+        with open(meta) as f:
+            saved = json.load(f)
+        if all(saved.get(k) == v for k, v in _edge_source(path, dtype, relabel, delimiter).items()):
+            return open_csr(directory)
+    return build_csr_file(path, directory, dtype, relabel, delimiter, chunk_edges)
+
+def _csr_directory(csr):
+    if isinstance(csr.indices, np.memmap) and csr.indices.filename:
+        return os.path.dirname(csr.indices.filename)
+    return None
+
+"""##Shared-memory buffers for the worker processes ✅
+
+parallel_sweep used to send the CSR arrays to every worker process, which unpickles its own copy, and every worker then recomputed the graph constants of the kernels (the sources of the edges and the maximum degrees, two arrays of the size of indices) for every task. For a graph with 10^7 edges this multiplies the memory by the number of workers. Now the arrays are placed once in shared memory and the workers attach to them without copying :
+- SharedArrays(arrays) copies a dictionary of numpy arrays into multiprocessing.shared_memory segments. shared.arrays holds the arrays backed by the segments and shared.spec (the names, dtypes and shapes of the segments) is the small picklable description that is sent to the workers, where attach_shared(spec) returns the same arrays without any copy.
+- The segments are removed by shared.close(), which is called when the with block ends (also after an exception), when the object is garbage collected and at the exit of the interpreter. If the main process is killed, the resource tracker of multiprocessing removes the segments it created.
+- parallel_sweep shares the CSR arrays (unless they are memory-mapped from a load_edge_list cache, in which case the workers open the same files), the graph constants, which the workers register with set_graph_constants so that graph_constants finds them, and an output array with one value per task. Each task writes its sum of fractions of cooperators into its own slot of the output array instead of returning it through a pipe.
+"""
+
+def _release_segments(segments):
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+class SharedArrays:
+    def __init__(self, arrays):
+        self.segments = []
+        self.arrays = {}
+        self.spec = {}
+        self._finalizer = weakref.finalize(self, _release_segments, self.segments)
+        try:
+            for name, a in arrays.items():
+                a = np.asarray(a)
+                shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+                self.segments.append(shm)
+                self.arrays[name] = np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)
+                self.arrays[name][...] = a
+                self.spec[name] = (shm.name, a.dtype.str, a.shape)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self.arrays = {}
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_attached_segments = []
+
+def attach_shared(spec):
+    arrays = {}
+    for name, (shm_name, dtype, shape) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _attached_segments.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return arrays
+
+"""##Generic 2x2 games ✅
+
+The notebook had two simulation loops : game_simulation, with the payoffs of payoff_node (R = 1 and P = 0, so only T and S are free), and snowdrift_game_simulation, with a second function also called payoff_node that replaced the first one for the rest of the notebook (so plots() was in fact running the hawk-dove payoffs). Every symmetric game with two strategies is given by its payoff matrix : R when both cooperate, S for a cooperator against a defector, T for a defector against a cooperator and P when both defect. A PayoffMatrix(R, S, T, P, normalization) describes it, with three ways of combining the games played with the neighbors :
+- 'accumulated' (the default) : the sum over the neighbors, c R + (k - c) S for a cooperator with k neighbors of which c cooperate, and c T + (k - c) P for a defector.
+- 'average' : the same sum divided by the degree.
+- 'presence' : a single game against the presence of cooperators in the neighborhood, R (or T) if at least one neighbor cooperates and S (or P) otherwise.
+
+All the simulations (game_simulation with every backend, MC, replica_game_simulation, sweep_game_simulation, phase_diagram, parallel_sweep, the class engine and plots) accept a matrix argument. The T and S of the simulation are the point of the T-S plane and the matrix gives R, P and the normalization, so the four games, which are lines of the T-S plane, can be swept for any matrix. Without a matrix the game is the one of payoff_node. The array backends compute the payoffs of every matrix from the number of cooperating neighbors with game_payoffs, and the networkx backend uses matrix_payoff_node when the matrix differs from the one of payoff_node. The update rules normalize the payoff differences with the whole matrix : phi, the largest payoff difference between two nodes, is max(ki, kj) (max(R, T) - min(P, S)) and psi, the shift that makes the payoffs of moran_rule non-negative, is the largest degree in the neighborhood times min(0, P, S). With R = 1 and P = 0 these are the phi and psi of the notebook. With the 'average' and 'presence' normalizations the payoff of a node is a single game value, so phi and psi do not have the degree factor. The per-node rules read the matrix of the run from the Payoffs they receive (payoffs.matrix, set by game_simulation next to its random stream, and None for a plain list of payoffs, which means R = 1 and P = 0), and the kernels and the class engine get it through rule_constants(csr, T, S, matrix) and their matrix argument.
+
+The hawk-dove game of the second simulation is hawk_dove_matrix(R, C) : hawks are the strategy 1, a hawk gets R - C/2 when there is a hawk around and R/2 otherwise, and a dove gets 3R/2 when there is a hawk around and R/2 otherwise, with the 'presence' normalization. snowdrift_game_simulation is now game_simulation with this matrix, and the matrix replaces its payoff function. It runs on the networkx and csr backends : its update rule is a per-node function of R and C with no kernel, so backend='vectorized' raises a ValueError.
+"""
+
+PayoffMatrix = namedtuple('PayoffMatrix', ['R', 'S', 'T', 'P', 'normalization'], defaults=['accumulated'])
+
+def _payoff_matrix(T, S, matrix=None):
+    return PayoffMatrix(1, S, T, 0) if matrix is None else matrix._replace(S=S, T=T)
+
+
+def hawk_dove_matrix(R, C):
+    return PayoffMatrix(R - C / 2, R / 2, 3 * R / 2, R / 2, 'presence')
+
+def matrix_payoff_node(n, G, C, matrix):
+    constants = node_constants(G)
+    c = sum(1 for j in constants.neighbors[n] if j in C)
+    return float(_payoffs_from_counts(constants.degree[n], int(n in C), c, matrix))
+
+"""##Reproducible random streams ✅
+
+The per-node rules drew their random numbers one by one from the global Mersenne Twister, through two names (random and rd) of the same module, and the initial defectors came from rd.sample, so a simulation could not be reproduced without seeding the global state and two simulations could not run side by side with independent streams. The batched simulations used one numpy generator for the whole batch, so the result of a replica depended on the other rows of its batch.
+
+- The per-node rules now draw from a BlockRandom, which takes uniform numbers from a numpy generator in blocks of 4096 and hands them out one at a time (choice(Ni) uses one uniform number too). game_simulation takes an rng (a numpy generator or a seed), draws the initial defectors from it and builds the BlockRandom of the run on it, so game_simulation(..., rng=seed) is reproducible. There is no global random state : the rules find the BlockRandom of the run on the Payoffs they receive (payoffs.random), so two simulations running side by side, in threads for instance, never share a stream. A rule called directly with a plain list of payoffs turns it into a Payoffs with a fresh generator (as_payoffs).
+- The batched simulations use ReplicaStreams : every row has its own 128-bit key, derived by replica_streams from the master seed (its entropy and, for a SeedSequence obtained with spawn, its spawn key, so sibling seeds give independent streams) and (update rule name, index of the point, index of the replica), and a counter of the numbers it has drawn. The uniform numbers are a counter-based generator : the i-th number of a row is a hash (the SplitMix64 finalizer) of its key and of i, so random(shape) computes the numbers of all the rows at once with a few vectorized integer operations, and every row gets the same numbers whatever the rows around it. The binomial and hypergeometric draws of the class engine use a Philox generator per row keyed with the same key.
+- replica_game_simulation and sweep_game_simulation take either a numpy generator (one stream shared by the batch, as before) or a seed, in which case every replica gets its stream. The fractions of cooperators of a sweep are then identical bit for bit for any batch_size, and identical to parallel_sweep with the same seed for any number of workers and chunk_size.
+"""
+
+_golden_gamma = np.uint64(0x9e3779b97f4a7c15)
+
+def _mix64(z):
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return z ^ (z >> np.uint64(31))
+
+class BlockRandom:
+    def __init__(self, rng=None, block=4096):
+        self.block = block
+        self.use(rng)
+
+    def use(self, rng=None):
+        self.rng = np.random.default_rng(rng)
+        self.values = []
+
+    def random(self):
+        if not self.values:
+            self.values = self.rng.random(self.block).tolist()
+        return self.values.pop()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+class ReplicaStreams:
+    def __init__(self, keys, counters=None, generators=None):
+        self.keys = keys
+        self.counters = np.zeros(len(keys), dtype=np.uint64) if counters is None else counters
+        self._generators = generators
+
+    def __len__(self):
+        return len(self.keys)
+
+    def compress(self, keep):
+        generators = None if self._generators is None else [g for g, k in zip(self._generators, keep) if k]
+        return ReplicaStreams(self.keys[keep], self.counters[keep], generators)
+
+    def random(self, shape):
+        shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        n = int(np.prod(shape[1:], dtype=np.int64))
+        with np.errstate(over='ignore'):
+            z = (self.counters[:, np.newaxis] + np.arange(n, dtype=np.uint64)) * _golden_gamma + self.keys[:, :1]
+            z = _mix64(z ^ self.keys[:, 1:])
+        self.counters += np.uint64(n)
+        return ((z >> np.uint64(11)) * 2.0**-53).reshape(shape)
+
+    def generators(self):
+        if self._generators is None:
+            self._generators = [np.random.Generator(np.random.Philox(key=key)) for key in self.keys]
+        return self._generators
+
+    def binomial(self, n, p):
+        n, p = np.broadcast_arrays(n, p)
+        return np.array([g.binomial(n[i], p[i]) for i, g in enumerate(self.generators())], dtype=np.int64).reshape(n.shape)
+
+    def multivariate_hypergeometric(self, colors, nsample, size):
+        return np.array([g.multivariate_hypergeometric(colors, nsample) for g in self.generators()], dtype=np.int64).reshape(size, len(colors))
+
+def _seed_sequence(seed):
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+def replica_streams(seed, update_rule, points, replicas):
+    master = _seed_sequence(seed)
+    rule = zlib.crc32(update_rule.__name__.encode())
+    keys = [np.random.SeedSequence(master.entropy, spawn_key=master.spawn_key + (rule, int(k), int(r))).generate_state(2, np.uint64) for k, r in zip(points, replicas)]
+    return ReplicaStreams(np.array(keys, dtype=np.uint64).reshape(len(keys), 2))
+
+def _row_streams(rng, update_rule, points, replicas):
+    if isinstance(rng, (np.random.Generator, ReplicaStreams)):
+        return rng
+    return replica_streams(rng, update_rule, points, replicas)
+
+def _compress_streams(rng, keep):
+    return rng.compress(keep) if isinstance(rng, ReplicaStreams) else rng
+
+"""##Asynchronous updates ✅
+
+game_simulation updates all the nodes synchronously : every node decides with the payoffs of the previous step and then C is replaced at once. Much of the literature uses asynchronous updates, where a node that changes its strategy immediately changes the payoffs seen by the next nodes. game_simulation(..., update=...) now supports three modes, with the same update_rule functions (MC and plots take the same argument) :
+- 'synchronous' : the previous behaviour.
+- 'random_sequential' : a Monte Carlo step is N single-node updates, in a new random order (a random permutation of the nodes) at every step.
+- 'gillespie' : continuous time where every node updates at rate 1. The time between two updates is exponential with rate N, so a unit of time (one step) holds a Poisson(N) number of updates, each of a uniformly random node.
+
+Recomputing the N payoffs after every single update would cost O(N E) per step. Instead we keep the number of cooperating neighbors of every node, and asynchronous_step only touches the node that changed and its neighbors : their counts change by one and their payoffs are recomputed from the counts with _node_payoff, so a step costs O(E) in total. The Payoffs list also keeps its cached maximum and position of the maximum when an entry changes (it only recomputes them when the maximum itself decreases), so stochastic_best_response_rule and unconditional_imitation_rule do not scan the population after every update. asynchronous_step keeps the number of cooperators and stops as soon as the population is absorbed, in the middle of a step, since the synchronous simulation also stops at full cooperation or full defection (and with no payoff left stochastic_best_response_rule has nothing to normalize by : it does not update when the maximum payoff is not positive). The asynchronous modes run on the per-node rules, with backend='networkx' or 'csr'.
+"""
+
+update_modes = ('synchronous', 'random_sequential', 'gillespie')
+
+def _node_payoff(x, k, c, matrix):
+    R, S, T, P, normalization = matrix
+    if normalization == 'presence':
+        k, c = 1, min(c, 1)
+    payoff = c * R + (k - c) * S if x else c * T + (k - c) * P
+    return payoff / max(k, 1) if normalization == 'average' else payoff
+
+def asynchronous_step(G, nodes, C, S, T, update_rule, payoffs, cooperating, matrix, order):
+    constants = node_constants(G)
+    position = C.position
+    N, cooperators = len(nodes), len(C)
+    for k in order:
+        i = nodes[k]
+        s = update_rule(i, G, C, S, T, payoffs)
+        x = C.bytes[k]
+        if (s == 'C' and x) or (s == 'D' and not x) or s is None:
+            continue
+        x = C.bytes[k] = 1 - x
+        payoffs[i] = _node_payoff(x, constants.degree[i], cooperating[k], matrix)
+        delta = 1 if x else -1
+        for j in constants.neighbors[i]:
+            q = j if position is None else position[j]
+            cooperating[q] += delta
+            payoffs[j] = _node_payoff(C.bytes[q], constants.degree[j], cooperating[q], matrix)
+        cooperators += delta
+        if cooperators in (0, N):
+            return
+
+"""##Snapshots, resuming and warm starts ✅
+
+With Tmax = 10000 and Ttrans = 9000 every replica of every (T, S) point spends 90% of its time in the transient phase, a long run cannot be resumed after a crash and an equilibrated configuration cannot be reused. game_simulation can now save and start from snapshots :
+- A Snapshot holds the number of nodes, the bit-packed strategies (pack_strategies), the state of the random generator, the step counter, the accumulated number of cooperators P and the uniform numbers of the current block of the BlockRandom of the run that were not used yet. save_snapshot writes it atomically to a .npz file and load_snapshot reads it back.
+- game_simulation(..., checkpoint=path, checkpoint_every=k) saves a snapshot every k steps and at the end of the run (checkpoint can also be a function receiving the Snapshot). Saving a snapshot does not touch the generator or the block, so the trajectory does not depend on checkpoint_every.
+- game_simulation(..., start=snapshot) starts from a snapshot instead of a random initial state : it restores the strategies, the generator, the rest of the block, the step and P, so a run resumed from its last checkpoint gives exactly the result of the uninterrupted run.
+- branch_snapshot(snapshot, n, seed) returns n copies of a snapshot with independent generators (spawned from seed), to run many statistically independent measurement replicas from one equilibrated state. warm_start(snapshot, transient) turns the final snapshot of a run into the start of a new measurement : it keeps the strategies and restarts the clock transient steps before Ttrans with P = 0.
+- annealed_sweep(G, TS_list, Nrep, update_rule) sweeps a game line with the batched simulations, starting every (T, S) point from the final strategies of the previous point (annealing along the line) and running only warm_steps transient steps (Ttrans // 10 by default) before measuring the last Tmax - Ttrans steps. Only the first point pays for the full transient. The replicas use the same random streams as sweep_game_simulation. A replica that reached full cooperation or full defection starts the next point from that state. With the imitation rules it stays there, but random_rule and generous_tit_for_tat_rule (which returns 'C' when it does not imitate) can leave it, and the first step decides again.
+"""
+
+Snapshot = namedtuple('Snapshot', ['N', 'strategies', 'rng_state', 'step', 'P', 'block'], defaults=[None])
+
+def _rng_state(rng):
+    state = rng.bit_generator.state
+    return json.loads(json.dumps(state, default=lambda a: a.tolist()))
+
+def _restore_rng(state):
+    bit_generator = getattr(np.random, state['bit_generator'])()
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+def save_snapshot(path, snapshot):
+    tmp = str(path) + '.tmp'
+    with open(tmp, 'wb') as f:
+        block = np.zeros(0) if snapshot.block is None else snapshot.block
+        np.savez(f, N=snapshot.N, strategies=snapshot.strategies, rng_state=json.dumps(snapshot.rng_state), step=snapshot.step, P=snapshot.P, block=block)
+    os.replace(tmp, path)
+
+def load_snapshot(path):
+    with np.load(path) as f:
+        rng_state = json.loads(str(f['rng_state']))
+        block = f['block'] if 'block' in f.files else None
+        return Snapshot(int(f['N']), f['strategies'], rng_state, int(f['step']), f['P'].item(), block)
+
+def branch_snapshot(snapshot, n, seed=None):
+    return [snapshot._replace(rng_state=_rng_state(np.random.default_rng(child)), block=None) for child in _seed_sequence(seed).spawn(n)]
+
+def warm_start(snapshot, transient):
+    return snapshot._replace(step=max(config.Ttrans - transient, 0), P=0)
+
+def annealed_sweep(G, TS_list, Nrep, update_rule, seed=None, warm_steps=None, matrix=None):
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    warm_steps = config.Ttrans // 10 if warm_steps is None else warm_steps
+    kernel = rule_kernels.get(update_rule, update_rule)
+    master = _seed_sequence(seed)
+    s = None
+    p_list = np.zeros(len(TS_list))
+    for k, (t, s_k) in enumerate(TS_list):
+        rng = replica_streams(master, update_rule, np.full(Nrep, k), np.arange(Nrep))
+        final = np.empty((Nrep, (len(csr.nodes) + 7) // 8), dtype=np.uint8)
+        start_step = 0 if s is None else max(config.Ttrans - warm_steps, 0)
+        p = _simulate_rows(csr, np.full(Nrep, t), np.full(Nrep, s_k), kernel, rng, matrix=matrix, initial=s, start_step=start_step, final=final)
+        p_list[k] = p.mean()
+        s = final
+    return p_list
+
+"""##Streaming trajectory recorder ✅
+
+With plot_time=True the fraction of cooperators of every step is appended to the list p_t and plotted at the end, and nothing else about the dynamics is kept. To study how clusters of cooperators form we need the strategy of every node at every step, which is 10^10 values for 10^4 steps of a network of 10^6 nodes. game_simulation(..., recorder=TrajectoryRecorder(path)) (and vectorized_game_simulation) streams the trajectory to disk while the run progresses :
+- The observables are 'fraction' (the fraction of cooperators), 'degree_classes' (the number of cooperators among the nodes of every degree, the degrees and the sizes of the classes are saved with the file) and 'deltas' (the bit-packed exclusive or between the strategies of a step and of the previous one, the first row being the initial strategies). Row 0 of every observable is the initial state and row t is the state after step t. The observables argument selects a subset.
+- Every observable is buffered in memory in a block of chunk_steps rows, and a full block is appended to its own file under path (compressed with zlib when compress=True, the deltas are mostly zeros and compress very well). meta.json, rewritten after every block, records the dtype, the shape and the position of every block, so a run that stops keeps everything written up to its last block.
+- Trajectory(path) reads a recording. read(name, start, stop) only decompresses the blocks it needs, or uses a memory map of the file when the recording is not compressed, and strategies(t) rebuilds the strategy of every node at step t by combining the deltas.
+"""
+
+trajectory_observables = ('fraction', 'degree_classes', 'deltas')
+
+class TrajectoryRecorder:
+    def __init__(self, path, observables=trajectory_observables, chunk_steps=128, compress=True):
+        self.path = path
+        self.observables = list(observables)
+        self.chunk_steps = chunk_steps
+        self.compress = compress
+        self.closed = True
+
+    def begin(self, degree, s):
+        os.makedirs(self.path, exist_ok=True)
+        self.degrees, self.classes = np.unique(degree, return_inverse=True)
+        self.previous = np.zeros((len(s) + 7) // 8, dtype=np.uint8)
+        rows = {'fraction': ((), np.float64), 'degree_classes': ((len(self.degrees),), np.int64), 'deltas': ((len(self.previous),), np.uint8)}
+        self.meta = {'N': len(s), 'compress': self.compress, 'degrees': self.degrees.tolist(), 'class_sizes': np.bincount(self.classes).tolist(), 'observables': {}}
+        self.buffers = {}
+        for name in self.observables:
+            shape, dtype = rows[name]
+            self.meta['observables'][name] = {'dtype': np.dtype(dtype).str, 'shape': list(shape), 'rows': 0, 'chunks': []}
+            self.buffers[name] = np.empty((self.chunk_steps,) + shape, dtype=dtype)
+            open(os.path.join(self.path, name + '.bin'), 'wb').close()
+        self.filled = 0
+        self.closed = False
+        self.record(s)
+
+    def record(self, s):
+        row = self.filled
+        if 'fraction' in self.buffers:
+            self.buffers['fraction'][row] = np.count_nonzero(s) / len(s)
+        if 'degree_classes' in self.buffers:
+            self.buffers['degree_classes'][row] = np.bincount(self.classes, weights=s, minlength=len(self.degrees))
+        if 'deltas' in self.buffers:
+            packed = pack_strategies(s)
+            np.bitwise_xor(packed, self.previous, out=self.buffers['deltas'][row])
+            self.previous = packed
+        self.filled += 1
+        if self.filled == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        for name, buffer in self.buffers.items():
+            data = buffer[:self.filled].tobytes()
+            if self.compress:
+                data = zlib.compress(data, 1)
+            entry = self.meta['observables'][name]
+            with open(os.path.join(self.path, name + '.bin'), 'ab') as f:
+                entry['chunks'].append([f.tell(), len(data), self.filled])
+                f.write(data)
+            entry['rows'] += self.filled
+        self.filled = 0
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Trajectory:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.N = self.meta['N']
+        self.degrees = np.array(self.meta['degrees'])
+        self.class_sizes = np.array(self.meta['class_sizes'])
+
+    def __len__(self):
+        return max(entry['rows'] for entry in self.meta['observables'].values())
+
+    def read(self, name, start=0, stop=None):
+        entry = self.meta['observables'][name]
+        dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+        stop = entry['rows'] if stop is None else min(stop, entry['rows'])
+        if not self.meta['compress']:
+            data = np.memmap(os.path.join(self.path, name + '.bin'), dtype=dtype, mode='r', shape=(entry['rows'],) + shape)
+            return data[start:stop]
+        parts = []
+        first = 0
+        with open(os.path.join(self.path, name + '.bin'), 'rb') as f:
+            for offset, length, rows in entry['chunks']:
+                if first < stop and first + rows > start:
+                    f.seek(offset)
+                    block = np.frombuffer(zlib.decompress(f.read(length)), dtype=dtype).reshape((rows,) + shape)
+                    parts.append(block[max(start - first, 0):stop - first])
+                first += rows
+        return np.concatenate(parts) if parts else np.empty((0,) + shape, dtype=dtype)
+
+    def strategies(self, t):
+        packed = np.bitwise_xor.reduce(self.read('deltas', 0, t + 1), axis=0)
+        return unpack_strategies(packed, self.N)
+
+"""##Adaptive number of replicas ✅
+
+MC runs the same Nrep replicas at every (T, S) point. The points deep in full cooperation or full defection return exactly 0 or 1 after a few steps and are known after a few replicas, while the points near a transition are noisy and would need many more. With a Precision(half_width, confidence, batch, min_replicas, max_replicas), adaptive_sweep runs the replicas of the points of TS_list in rounds of batch replicas per point, all the points of a round in one batched simulation, and after every round computes a confidence interval for every point :
+- When every replica of a point ended in full cooperation or full defection (0 or 1) the outcomes are Bernoulli and confidence_interval uses the Wilson score interval, which stays meaningful when all the outcomes are equal.
+- Otherwise it uses the normal interval mean +- z sd / sqrt(n), with z the quantile of the confidence level.
+
+A point stops once it has min_replicas replicas and the half-width of its interval is at most half_width, or when it reaches max_replicas. adaptive_sweep returns the p_list and an Estimate (p, low, high, replicas) for every point, so the replicas go to the points that need them. The replicas use the same random streams as sweep_game_simulation, so the first n replicas of a point are the same in both. MC(..., precision=Precision()) and plots(..., precision=Precision()) use it (plots also draws the intervals and prints the number of replicas used). The precision replaces Nrep, and adaptive_sweep always runs the batched synchronous engine, so MC and plots raise a ValueError when precision is given with another backend or update mode, plots and run_job when it is given with workers.
+"""
+
+Precision = namedtuple('Precision', ['half_width', 'confidence', 'batch', 'min_replicas', 'max_replicas'], defaults=[0.05, 0.95, 8, 8, 500])
+Estimate = namedtuple('Estimate', ['p', 'low', 'high', 'replicas'])
+
+def confidence_interval(values, confidence=0.95):
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = values.mean()
+    if ((values == 0) | (values == 1)).all():
+        center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+        half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    else:
+        center = p
+        half = z * values.std(ddof=1) / np.sqrt(n) if n > 1 else np.inf
+    return Estimate(float(p), float(max(center - half, 0)), float(min(center + half, 1)), n)
+
+def adaptive_sweep(G, TS_list, update_rule, precision=None, seed=None, matrix=None, instrument=None):
+    precision = Precision() if precision is None else precision
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    master = _seed_sequence(seed)
+    values = [[] for _ in TS_list]
+    estimates = [None] * len(TS_list)
+    running = list(range(len(TS_list)))
+    while running:
+        sizes = [min(precision.batch, precision.max_replicas - len(values[k])) for k in running]
+        points = np.repeat(running, sizes)
+        replicas = np.concatenate([np.arange(len(values[k]), len(values[k]) + n) for k, n in zip(running, sizes)])
+        T = np.array([TS_list[k][0] for k in points], dtype=np.float64)
+        S = np.array([TS_list[k][1] for k in points], dtype=np.float64)
+        p = _run_rows(csr, T, S, update_rule, replica_streams(master, update_rule, points, replicas), matrix=matrix, instrument=instrument)
+        for k, chunk in zip(running, np.split(p, np.cumsum(sizes)[:-1])):
+            values[k].extend(chunk.tolist())
+            estimates[k] = confidence_interval(values[k], precision.confidence)
+        running = [k for k in running if len(values[k]) < precision.max_replicas
+                   and (len(values[k]) < precision.min_replicas or (estimates[k].high - estimates[k].low) / 2 > precision.half_width)]
+    return np.array([e.p for e in estimates]), estimates
+
+"""##Library use and command line ✅
+
+Importing the notebook used to run every experiment below (hours of plots() calls, nx.draw and the LFR benchmark), and the parameters were module globals that the cells overwrote (Tmax = 1000 and Tmin = 900 or Trans = 9000 left Ttrans unchanged without any error). The module can now be imported to reuse the simulations : the experiments are in notebook_experiments(), networkx and matplotlib are only imported by the functions that plot or build networkx graphs, and the parameters are a SimulationConfig(Nrep, d_0, Tmax, Ttrans, n_points). All the simulations read the current config, configure(Tmax=1000, Ttrans=900) changes it (an unknown field such as Trans raises a ValueError, and so does Ttrans >= Tmax) and returns the previous one, and configure(previous) restores it. The worker processes of parallel_sweep get the config of the caller.
+
+A sweep can also be run without the notebook from a JSON job file :
+
+python complexnetworkproject_hajar_lachheb.py sweep job.json [--output results.json] [--workers n]
+
+The job has the fields of SweepJob : graph (a generator of the fast random graph generators with its arguments, e.g. {"generator": "random_regular", "d": 5, "N": 100, "seed": 1}, an edge list {"edge_list": path, ...} with the arguments of load_edge_list or a CSR directory {"csr": directory}), game (the name of a game line or a list of [T, S] points), update_rules (names), config (fields of SimulationConfig), matrix (fields of PayoffMatrix), workers, seed, cache (a ResultCache directory), precision (fields of Precision) and convergence (fields of Convergence). The results (the points, the p_list of every update rule, the config and the seed) are written as JSON, next to the job file by default. python complexnetworkproject_hajar_lachheb.py experiments runs the notebook experiments.
+"""
+
+SweepJob = namedtuple('SweepJob', ['graph', 'game', 'update_rules', 'config', 'matrix', 'workers', 'seed', 'cache', 'precision', 'convergence'],
+                      defaults=['weak_prisoner_dilemma'] + [None] * 8)
+
+graph_generators = {
+    'complete': lambda N: csr_from_edges(N, *np.triu_indices(N, 1)),
+    'er_gnk': er_gnk_csr,
+    'watts_strogatz': watts_strogatz_csr,
+    'community': community_csr,
+    'sbm': sbm_csr,
+    'random_regular': random_regular_csr,
+}
+
+games = {game.__name__: game for game in (weak_prisoner_dilemma, hawk_dove, stag_hunt, snow_drift)}
+
+rules = {rule.__name__: rule for rule in class_rules}
+
+def load_job(path):
+    with open(path) as f:
+        job = SweepJob(**json.load(f))
+    return job._replace(
+        config=config._replace(**(job.config or {})),
+        matrix=None if job.matrix is None else PayoffMatrix(**job.matrix),
+        precision=None if job.precision is None else Precision(**job.precision),
+        convergence=None if job.convergence is None else Convergence(**job.convergence))
+
+def job_graph(spec):
+    spec = dict(spec)
+    if 'edge_list' in spec:
+        return load_edge_list(spec.pop('edge_list'), **spec)
+    if 'csr' in spec:
+        return open_csr(spec['csr'])
+    return graph_generators[spec.pop('generator')](**spec)
+
+def run_job(job):
+    if job.cache is not None and (job.workers is None or job.precision is not None):
+        raise ValueError('cache needs workers and precision=None')
+    if job.convergence is not None and (job.workers is not None or job.precision is not None):
+        raise ValueError('convergence needs workers=None and precision=None')
+    if job.workers is not None and job.precision is not None:
+        raise ValueError('precision needs workers=None')
+    previous = configure(job.config)
+    try:
+        csr = job_graph(job.graph)
+        TS_list = games[job.game]() if isinstance(job.game, str) else [tuple(ts) for ts in job.game]
+        update_rules = [rules[name] for name in (job.update_rules or rules)]
+        master = _seed_sequence(job.seed)
+        result = {'TS': [[float(t), float(s)] for t, s in TS_list], 'config': config._asdict(), 'seed': master.entropy, 'p': {}}
+        if job.precision is not None:
+            result['intervals'], result['replicas'] = {}, {}
+            for update_rule in update_rules:
+                p_list, estimates = adaptive_sweep(csr, TS_list, update_rule, job.precision, master, job.matrix)
+                result['p'][update_rule.__name__] = p_list.tolist()
+                result['intervals'][update_rule.__name__] = [[e.low, e.high] for e in estimates]
+                result['replicas'][update_rule.__name__] = [e.replicas for e in estimates]
+        elif job.workers is not None:
+            cache = None if job.cache is None else ResultCache(job.cache)
+            p_lists = parallel_sweep(csr, TS_list, update_rules, workers=job.workers, seed=master, cache=cache, matrix=job.matrix)
+            result['p'] = {name: p_list.tolist() for name, p_list in p_lists.items()}
+        else:
+            for update_rule in update_rules:
+                p_list = sweep_game_simulation(csr, TS_list, config.Nrep, update_rule, master, convergence=job.convergence, matrix=job.matrix)
+                result['p'][update_rule.__name__] = (p_list if job.convergence is None else p_list[0]).tolist()
+        return result
+    finally:
+        configure(previous)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Evolutionary games on complex networks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sweep = commands.add_parser('sweep', help='run the sweep of a JSON job file')
+    sweep.add_argument('job')
+    sweep.add_argument('--output')
+    sweep.add_argument('--workers', type=int)
+    commands.add_parser('experiments', help='run the experiments of the notebook')
+    benchmark = commands.add_parser('benchmark', help='measure the engines on the notebook topologies')
+    benchmark.add_argument('--rules', nargs='+', choices=list(rules))
+    benchmark.add_argument('--topologies', nargs='+', choices=benchmark_topologies, default=benchmark_topologies)
+    benchmark.add_argument('--sizes', nargs='+', type=int, default=benchmark_sizes)
+    benchmark.add_argument('--engines', nargs='+', choices=benchmark_engines, default=benchmark_engines)
+    benchmark.add_argument('--budget', type=int, default=10**7)
+    benchmark.add_argument('--max-edges', type=int, default=10**7)
+    benchmark.add_argument('--networkx-nodes', type=int, default=10**5)
+    benchmark.add_argument('--output', default='benchmarks.json')
+    compare = commands.add_parser('compare', help='compare two benchmark files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+    if args.command == 'experiments':
+        notebook_experiments()
+        import matplotlib.pyplot as plt
+        plt.show()
+        return
+    if args.command == 'benchmark':
+        update_rules = None if args.rules is None else [rules[name] for name in args.rules]
+        run_benchmarks(update_rules, args.topologies, args.sizes, args.engines, args.budget, args.max_edges, args.networkx_nodes, output=args.output)
+        return
+    if args.command == 'compare':
+        with open(args.baseline) as f, open(args.current) as g:
+            deltas = compare_benchmarks(json.load(f), json.load(g), args.threshold)
+        regressions = [delta for delta in deltas if delta.ratio < 1 - args.threshold]
+        for delta in deltas:
+            flag = 'REGRESSION' if delta in regressions else ''
+            print(' '.join(map(str, delta.case)), f'{delta.baseline:.3g} -> {delta.current:.3g} ({delta.ratio:.2f}x)', flag)
+        print(f'{len(regressions)} regressions in {len(deltas)} cases')
+        return 1 if regressions else 0
+    job = load_job(args.job)
+    if args.workers is not None:
+        job = job._replace(workers=args.workers)
+    output = args.output or os.path.splitext(args.job)[0] + '_results.json'
+    with open(output, 'w') as f:
+        json.dump(run_job(job), f)
+    print(output)
+
+"""##Benchmarks ✅
+
+The only performance numbers of the notebook are that a plots() call took 2 or 3 hours and that moran_rule was the slowest. run_benchmarks measures every combination of update rule, topology, size and engine and returns the results as a dictionary that can be written as JSON, with the environment (Python, numpy and networkx versions, platform, number of CPUs, time) and the parameters of the run :
+- the topologies of the notebook : complete, random_regular (d = 5), ER (the G(N, K) generator behind ER_Gnk, average degree 5), BA (m = 5), watts_strogatz (k = 10, p = 0.3), SBM (4 blocks with the p_in = 0.8 and p_out = 0.1 of the notebook at N = 100, scaled as 100 / N to keep the average degree), LFR (the parameters of the notebook, with communities of at most N / 2 nodes since the generator can run for hours when a community may contain the whole graph) and karate (only 34 nodes, measured once).
+- the engines : networkx and csr are game_simulation with these backends, vectorized is game_simulation(..., backend='vectorized'), batched is the replica-batched simulation behind MC(..., backend='batched') with replicas replicas, and sweep is a plots()-style sweep_game_simulation of sweep_points points of the weak prisoner's dilemma line.
+
+Every case runs Tmax = budget // ((N + 2E) x rows) steps, where N + 2E is the work of a step on a graph with E edges (at least 2, at most the Tmax of the config), and reports the steps actually simulated (a replica that reaches full cooperation or full defection stops), counted by an Instrumentation so that every engine runs its usual path (the class engine on complete graphs for batched and sweep), the time, the steps per second and the node updates per second. The cases whose graph has more than max_edges edges, or more than networkx_nodes nodes for the networkx and csr engines, are recorded as skipped, and a graph that cannot be generated (the LFR generator sometimes fails) or a case that fails is recorded with its error. The simulations run at (T, S) = (1.2, -0.2) by default. compare_benchmarks(baseline, current, threshold) matches the cases of two result files and returns a BenchmarkDelta(case, baseline, current, ratio) for every case measured in both, where ratio is the ratio of the node updates per second; the ones below 1 - threshold are regressions.
+
+python complexnetworkproject_hajar_lachheb.py benchmark --sizes 100 1000 --output benchmarks.json runs the suite (with --rules, --topologies, --engines, --budget, --max-edges and --networkx-nodes to restrict it) and writes the file after every case, and python complexnetworkproject_hajar_lachheb.py compare baseline.json benchmarks.json prints the changes and exits with status 1 when there is a regression.
+"""
+
+benchmark_topologies = ('complete', 'random_regular', 'ER', 'BA', 'watts_strogatz', 'SBM', 'LFR', 'karate')
+benchmark_engines = ('networkx', 'csr', 'vectorized', 'batched', 'sweep')
+benchmark_sizes = (10**2, 10**3, 10**4, 10**5, 10**6)
+
+BenchmarkDelta = namedtuple('BenchmarkDelta', ['case', 'baseline', 'current', 'ratio'])
+
+def benchmark_edges(topology, N):
+    return N * (N - 1) // 2 if topology == 'complete' else int({'random_regular': 5, 'ER': 5, 'BA': 10, 'watts_strogatz': 10, 'SBM': 27.5, 'LFR': 5, 'karate': 4.6}[topology] * N / 2)
+
+def benchmark_graph(topology, N, seed=None):
+    if topology == 'complete':
+        return graph_generators['complete'](N)
+    if topology == 'random_regular':
+        return random_regular_csr(5, N, seed)
+    if topology == 'ER':
+        return er_gnk_csr(N, N * 5 // 2, seed)
+    if topology == 'watts_strogatz':
+        return watts_strogatz_csr(N, 10, 0.3, seed)
+    if topology == 'SBM':
+        scale = min(1, 100 / N)
+        p_matrix = np.full((4, 4), 0.1 * scale)
+        np.fill_diagonal(p_matrix, 0.8 * scale)
+        return sbm_csr([N // 4] * 4, p_matrix, seed)
+    import networkx as nx
+    if topology == 'BA':
+        return nx.barabasi_albert_graph(N, 5, seed)
+    if topology == 'LFR':
+        return nx.convert_node_labels_to_integers(nx.LFR_benchmark_graph(N, 4, 2.5, 0.2, average_degree=5, min_community=10, max_community=N // 2, seed=seed))
+    if topology == 'karate':
+        return nx.karate_club_graph()
+    raise ValueError(f'unknown topology {topology!r}, expected one of {benchmark_topologies}')
+
+def benchmark_environment():
+    try:
+        import networkx
+    except ImportError:
+        networkx = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'networkx': None if networkx is None else networkx.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+def _benchmark_case(G, csr, engine, update_rule, T, S, replicas, sweep_points, seed):
+    instrument = Instrumentation()
+    start = time.perf_counter()
+    if engine in ('networkx', 'csr', 'vectorized'):
+        game_simulation(G if engine != 'vectorized' else csr, T, S, update_rule, backend=engine, rng=seed, instrument=instrument)
+    elif engine == 'batched':
+        replica_game_simulation(csr, replicas, T, S, update_rule, seed, instrument=instrument)
+    else:
+        TS_list = [(t, 0.0) for t in np.linspace(1.0, 2.0, sweep_points)]
+        sweep_game_simulation(csr, TS_list, replicas, update_rule, seed, instrument=instrument)
+    seconds = time.perf_counter() - start
+    return seconds, sum(run.steps for run in instrument.runs), len(instrument.runs)
+
+def run_benchmarks(update_rules=None, topologies=benchmark_topologies, sizes=benchmark_sizes, engines=benchmark_engines,
+                   budget=10**7, max_edges=10**7, networkx_nodes=10**5, replicas=8, sweep_points=5, T=1.2, S=-0.2, seed=0, output=None):
+    update_rules = class_rules if update_rules is None else update_rules
+    results = {'environment': benchmark_environment(), 'config': config._asdict(),
+               'parameters': {'budget': budget, 'max_edges': max_edges, 'networkx_nodes': networkx_nodes, 'replicas': replicas, 'sweep_points': sweep_points, 'T': T, 'S': S, 'seed': seed},
+               'results': []}
+    for topology in topologies:
+        for N in (sizes[:1] if topology == 'karate' else sizes):
+            case = {'topology': topology, 'N': N}
+            if benchmark_edges(topology, N) > max_edges:
+                results['results'].append(dict(case, skipped='more than max_edges edges'))
+                continue
+            try:
+                start = time.perf_counter()
+                G = benchmark_graph(topology, N, seed)
+                csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+                build = time.perf_counter() - start
+            except Exception as error:
+                results['results'].append(dict(case, error=f'{type(error).__name__}: {error}'))
+                continue
+            N = len(csr.nodes)
+            case.update(N=N, edges=len(csr.indices) // 2, build_seconds=build)
+            for engine in engines:
+                if engine in ('networkx', 'csr') and N > networkx_nodes:
+                    results['results'].append(dict(case, engine=engine, skipped='more than networkx_nodes nodes'))
+                    continue
+                if engine in ('networkx', 'csr') and isinstance(G, CSRGraph):
+                    G = nx_graph(csr)
+                rows = 1 if engine in ('networkx', 'csr', 'vectorized') else replicas * (sweep_points if engine == 'sweep' else 1)
+                steps = int(min(max(budget // ((N + len(csr.indices)) * rows), 2), config.Tmax))
+                for update_rule in update_rules:
+                    previous = configure(Tmax=steps, Ttrans=steps - 1)
+                    try:
+                        seconds, simulated, rows = _benchmark_case(G, csr, engine, update_rule, T, S, replicas, sweep_points, seed)
+                    except Exception as error:
+                        results['results'].append(dict(case, engine=engine, rule=update_rule.__name__, error=f'{type(error).__name__}: {error}'))
+                        continue
+                    finally:
+                        configure(previous)
+                    results['results'].append(dict(case, engine=engine, rule=update_rule.__name__, steps=steps, rows=rows, simulated_steps=simulated, seconds=seconds,
+                                                   steps_per_second=simulated / seconds, node_updates_per_second=simulated * N / seconds))
+                    print(f"{topology} N={N} {engine} {update_rule.__name__}: {simulated * N / seconds:.3g} node updates/s")
+                    if output is not None:
+                        with open(output, 'w') as f:
+                            json.dump(results, f, indent=1)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+    return results
+
+def _benchmark_key(result):
+    return (result['topology'], result['N'], result.get('engine'), result.get('rule'))
+
+def compare_benchmarks(baseline, current, threshold=0.1):
+    measured = {_benchmark_key(r): r['node_updates_per_second'] for r in baseline['results'] if 'node_updates_per_second' in r}
+    deltas = [BenchmarkDelta(_benchmark_key(r), measured[_benchmark_key(r)], r['node_updates_per_second'], r['node_updates_per_second'] / measured[_benchmark_key(r)])
+              for r in current['results'] if 'node_updates_per_second' in r and _benchmark_key(r) in measured]
+    return sorted(deltas, key=lambda delta: delta.ratio)
+
+"""##Instrumentation and profiling ✅
+
+When a sweep is slow there was no way to know whether the time goes to the payoffs, the update rules, applying the new strategies or the rest of the loop. game_simulation (every backend and update mode), MC, replica_game_simulation, sweep_game_simulation, adaptive_sweep and plots (without workers) accept an instrument=Instrumentation(...) that records :
+- the wall time of every phase of a step : payoff (computing the payoffs), rule (the update rule calls, or the kernel of the array engines; an asynchronous step, which updates the payoffs after every flip, counts as rule), commit (applying the new strategies, and dropping the finished replicas of the batched engine) and bookkeeping (counting the cooperators, the snapshots and the recorder).
+- the number of calls of every update rule (the kernel name for the array engines), the number of steps and the strategy flips of every step.
+- every finished run (a replica for the batched engine) as a RunRecord(rule, engine, N, steps, outcome), with the steps to full cooperation or full defection ('absorbed'), to stationarity ('converged', with a convergence monitor) or the horizon ('horizon').
+
+on_step(step, flips, cooperators) and on_run(record) are called after every step and every run, summary() returns all the numbers as a dictionary and report() as text. With a profiler (anything with start() and stop(), for instance SamplingProfiler(interval), which samples the Python stack every interval seconds of CPU time with a SIGPROF timer, or pyinstrument), the profiler runs during the simulations only, and SamplingProfiler.top(n) gives the functions seen in the most samples. Without instrument the loops only test instrument is not None a few times per step, so the instrumentation can stay in the production code paths, and passing one does not change the engine : on complete graphs the class engine reports its steps, N calls per replica and step, and the nodes that change strategy in its binomial draws under the engine name 'classes' (the probabilities count as rule and the draws as commit).
+"""
+
+RunRecord = namedtuple('RunRecord', ['rule', 'engine', 'N', 'steps', 'outcome'])
+
+class Instrumentation:
+    phases = ('payoff', 'rule', 'commit', 'bookkeeping')
+
+    def __init__(self, on_step=None, on_run=None, profiler=None):
+        self.on_step = on_step
+        self.on_run = on_run
+        self.profiler = profiler
+        self.seconds = dict.fromkeys(self.phases, 0.0)
+        self.rule_calls = {}
+        self.steps = 0
+        self.flips = 0
+        self.max_flips = 0
+        self.runs = []
+        self.rule = self.engine = self.N = None
+        self.last = None
+
+    def begin(self, update_rule, engine, N):
+        self.rule, self.engine, self.N = update_rule.__name__, engine, N
+        self.rule_calls.setdefault(self.rule, 0)
+        if self.profiler is not None:
+            self.profiler.start()
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.seconds[phase] += now - self.last
+        self.last = now
+
+    def step(self, t, flips, cooperators, calls):
+        self.lap('bookkeeping')
+        self.rule_calls[self.rule] += calls
+        self.steps += 1
+        self.flips += flips
+        self.max_flips = max(self.max_flips, flips)
+        if self.on_step is not None:
+            self.on_step(t, flips, cooperators)
+            self.last = time.perf_counter()
+
+    def end(self, steps, outcome):
+        record = RunRecord(self.rule, self.engine, self.N, steps, outcome)
+        self.runs.append(record)
+        if self.on_run is not None:
+            self.on_run(record)
+
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def summary(self):
+        total = sum(self.seconds.values())
+        steps = np.array([run.steps for run in self.runs])
+        outcomes = {}
+        for run in self.runs:
+            outcomes[run.outcome] = outcomes.get(run.outcome, 0) + 1
+        return {
+            'seconds': dict(self.seconds),
+            'fractions': {phase: seconds / total if total else 0.0 for phase, seconds in self.seconds.items()},
+            'rule_calls': dict(self.rule_calls),
+            'steps': self.steps,
+            'flips': self.flips,
+            'flips_per_step': self.flips / self.steps if self.steps else 0.0,
+            'max_flips': self.max_flips,
+            'runs': len(self.runs),
+            'outcomes': outcomes,
+            'steps_to_end': {'mean': float(steps.mean()), 'min': int(steps.min()), 'max': int(steps.max())} if len(steps) else None,
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = [f"{phase:12s} {summary['seconds'][phase]:10.4f} s {100 * summary['fractions'][phase]:6.1f} %" for phase in self.phases]
+        lines += [f'{rule} : {calls} calls' for rule, calls in summary['rule_calls'].items()]
+        lines.append(f"{summary['steps']} steps, {summary['flips_per_step']:.2f} flips per step (at most {summary['max_flips']})")
+        if summary['steps_to_end'] is not None:
+            lines.append(f"{summary['runs']} runs {summary['outcomes']}, {summary['steps_to_end']['mean']:.1f} steps on average ({summary['steps_to_end']['min']} to {summary['steps_to_end']['max']})")
+        return '\n'.join(lines)
+
+class SamplingProfiler:
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = 0
+        self.leaf = {}
+        self.inclusive = {}
+
+    def _sample(self, signum, frame):
+        self.samples += 1
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, frame.f_lineno)
+        self.leaf[key] = self.leaf.get(key, 0) + 1
+        seen = set()
+        while frame is not None:
+            name = frame.f_code.co_name
+            if name not in seen:
+                seen.add(name)
+                self.inclusive[name] = self.inclusive.get(name, 0) + 1
+            frame = frame.f_back
+
+    def start(self):
+        import signal
+        self.previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        import signal
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous)
+
+    def top(self, n=20, inclusive=True):
+        counts = self.inclusive if inclusive else self.leaf
+        return sorted(counts.items(), key=lambda item: -item[1])[:n]
+
+"""##Adaptive refinement of the T-S grid ✅
+
+The games sweep a uniform grid of n_points points along their line, and most of these points are on the plateaus at 0 or 1 where nothing changes, while the transitions are narrow. refine_line(G, game, update_rule, refinement) and refine_plane(G, update_rule, t_range, s_range, refinement) place the points where they are needed, with a Refinement(tolerance, coarse, depth, max_points) :
+- The points are on a lattice : coarse points along the line (coarse x coarse points of the T-S rectangle for the plane), each interval (cell) of which can be halved depth times, so the finest spacing of a line is 1 / ((coarse - 1) 2^depth) of its length. With the defaults (9 points, depth 3) this is 65 points, finer than the 50 points of the uniform grid.
+- Every point is simulated with Nrep replicas (config.Nrep by default). An interval of the line is halved when the change of the fraction of cooperators between its ends plus their standard errors is larger than tolerance, that is when the curve changes fast or is uncertain there. A cell of the plane is split in four (adding the middles of its sides and its center) when the spread of the fraction of cooperators on its corners plus the largest standard error is larger than tolerance.
+- The new points of a round are simulated together in one batched simulation, and the rounds continue until no interval or cell needs refinement or, with max_points, until the budget of points is used (the intervals and cells with the largest changes are refined first).
+
+Every replica uses the random stream of its lattice point and its index (the rounds are sweep_game_simulation calls with the indices of the lattice points as points), so a point has the same result whatever the order of the refinement. Both functions return the TS_list of the simulated points (along the line, or by rows of S and T), the p_list and an Estimate for every point. plot_refined_plane draws the fraction of cooperators of refine_plane over the plane and marks the simulated points.
+"""
+
+Refinement = namedtuple('Refinement', ['tolerance', 'coarse', 'depth', 'max_points'], defaults=[0.05, 9, 3, None])
+
+def _standard_error(values):
+    return values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+
+def refine_line(G, game, update_rule, refinement=None, Nrep=None, seed=None, matrix=None):
+    refinement = Refinement() if refinement is None else refinement
+    Nrep = config.Nrep if Nrep is None else Nrep
+    line = game() if callable(game) else game
+    start, end = np.asarray(line[0], dtype=np.float64), np.asarray(line[-1], dtype=np.float64)
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    master = _seed_sequence(seed)
+    step = 2**refinement.depth
+    lattice = (refinement.coarse - 1) * step
+    values = {}
+    new = list(range(0, lattice + 1, step))
+    while new:
+        for i, p in zip(new, sweep_game_simulation(csr, [start + (end - start) * i / lattice for i in new], Nrep, update_rule, master, matrix=matrix, points=new, mean=False)):
+            values[i] = p
+        keys = sorted(values)
+        candidates = sorted(((abs(values[a].mean() - values[b].mean()) + _standard_error(values[a]) + _standard_error(values[b]), (a + b) // 2)
+                             for a, b in zip(keys, keys[1:]) if b - a > 1), reverse=True)
+        new = [i for score, i in candidates if score > refinement.tolerance]
+        if refinement.max_points is not None:
+            new = new[:max(refinement.max_points - len(values), 0)]
+    keys = sorted(values)
+    TS_list = [tuple((start + (end - start) * i / lattice).tolist()) for i in keys]
+    estimates = [confidence_interval(values[i]) for i in keys]
+    return TS_list, np.array([e.p for e in estimates]), estimates
+
+def refine_plane(G, update_rule, t_range, s_range, refinement=None, Nrep=None, seed=None, matrix=None):
+    refinement = Refinement() if refinement is None else refinement
+    Nrep = config.Nrep if Nrep is None else Nrep
+    csr = G if isinstance(G, CSRGraph) else csr_graph(G)
+    master = _seed_sequence(seed)
+    step = 2**refinement.depth
+    lattice = (refinement.coarse - 1) * step
+    def ts(i, j):
+        return (t_range[0] + (t_range[1] - t_range[0]) * i / lattice, s_range[0] + (s_range[1] - s_range[0]) * j / lattice)
+    values = {}
+    cells = [(i, j, step) for i in range(0, lattice, step) for j in range(0, lattice, step)]
+    new = [(i, j) for j in range(0, lattice + 1, step) for i in range(0, lattice + 1, step)]
+    while new:
+        keys = [i * (lattice + 1) + j for i, j in new]
+        for point, p in zip(new, sweep_game_simulation(csr, [ts(i, j) for i, j in new], Nrep, update_rule, master, matrix=matrix, points=keys, mean=False)):
+            values[point] = p
+        candidates = []
+        for i, j, size in cells:
+            if size > 1:
+                corners = [values[i, j], values[i + size, j], values[i, j + size], values[i + size, j + size]]
+                means = [corner.mean() for corner in corners]
+                score = max(means) - min(means) + max(_standard_error(corner) for corner in corners)
+                if score > refinement.tolerance:
+                    candidates.append((score, (i, j, size)))
+        candidates.sort(reverse=True)
+        new, split = [], set()
+        for score, (i, j, size) in candidates:
+            h = size // 2
+            points = [point for point in [(i + h, j), (i, j + h), (i + h, j + h), (i + size, j + h), (i + h, j + size)] if point not in values and point not in new]
+            if refinement.max_points is not None and len(values) + len(new) + len(points) > refinement.max_points:
+                break
+            new.extend(points)
+            split.add((i, j, size))
+        cells = [cell for cell in cells if cell not in split] + [(i + a, j + b, size // 2) for i, j, size in split for a in (0, size // 2) for b in (0, size // 2)]
+    points = sorted(values, key=lambda point: (point[1], point[0]))
+    TS_list = [ts(i, j) for i, j in points]
+    estimates = [confidence_interval(values[point]) for point in points]
+    return TS_list, np.array([e.p for e in estimates]), estimates
+
+def plot_refined_plane(G, name, update_rule, t_range, s_range, refinement=None, Nrep=None, seed=None):
+    import matplotlib.pyplot as plt
+    TS_list, p_list, estimates = refine_plane(G, update_rule, t_range, s_range, refinement, Nrep, seed)
+    T, S = np.array(TS_list).T
+    plt.figure(figsize=(8,6))
+    plt.title(name + ' : ' + update_rule.__name__ + f' ({len(TS_list)} points)')
+    plt.tripcolor(T, S, p_list, shading='gouraud', vmin=0, vmax=1)
+    plt.colorbar(label='fraction of cooperators')
+    plt.plot(T, S, 'k.', markersize=2)
+    plt.xlabel('T')
+    plt.ylabel('S')
+    return TS_list, p_list, estimates
+
+"""##Coevolving networks ✅
+
+All the experiments keep the network fixed, while in adaptive networks the players also cut their links to defectors and make new ones during the game. Doing this with networkx add_edge and remove_edge calls in the loop of game_simulation would be very slow, so coevolution_game_simulation keeps the network in a DynamicGraph : a CSR structure with slack, where every node owns a block of capacity slots of which the first degree are its neighbors, and every slot knows the slot of the same edge in the block of the other end (twin).
+- add_edge(i, j) appends j to the block of i and i to the block of j. A full block is moved to the end of the storage with twice its capacity (the storage itself doubles when needed), so an insertion costs O(1) amortized, and the storage is compacted when more than half of it is unused.
+- remove_edge(i, j) finds j in the block of i, and removes both slots by moving the last neighbor of each block into the hole (swap-remove), in O(degree of i).
+- csr() returns the usual compact CSRGraph, rebuilt in O(E) only after the network has changed, so the vectorized kernels of the update rules run on it unchanged.
+
+coevolution_game_simulation(G, T, S, update_rule, rewiring_rule, W) runs the vectorized engine and, after the strategy update of every step, asks the rewiring rule for the links to move and applies them. The numbers of cooperating neighbors and the payoffs are updated incrementally : for the strategy changes as in the other array engines, and for every moved link only the three nodes involved are recomputed. A rewiring rule is a function rule(graph, csr, s, payoffs, rng, W) returning three arrays (i, j, k) : i cuts its link to j and links to k (a move is ignored when the link i-j does not exist anymore, k is i or k is already a neighbor of i). Two rules are defined :
+- defector_rewiring : every cooperator looks at a random neighbor and, if it is a defector, with probability W replaces it by a random node of the network.
+- payoff_rewiring : every node looks at a random neighbor and, if it is a defector with a higher payoff, with probability W replaces it by a random neighbor of this defector.
+
+With W = 0 (or rewiring_rule=None) it is the vectorized simulation, and G can be a DynamicGraph, which is then modified in place so that the final network can be studied.
+"""
+
+class DynamicGraph:
+    def __init__(self, csr, slack=2):
+        N = len(csr.degree)
+        self.N = N
+        self.slack = slack
+        self.degree = np.array(csr.degree, dtype=np.int64)
+        self.capacity = np.maximum(slack * self.degree, 1)
+        self.start = np.zeros(N, dtype=np.int64)
+        np.cumsum(self.capacity[:-1], out=self.start[1:])
+        self.used = int(self.capacity.sum())
+        self.unused = 0
+        self.neighbors = np.zeros(max(2 * self.used, 16), dtype=_index_dtype(N))
+        self.twin = np.zeros(len(self.neighbors), dtype=np.int64)
+        slots = np.repeat(self.start - csr.indptr[:-1], self.degree) + np.arange(len(csr.indices))
+        sources = _edge_sources(csr)
+        keys = sources * N + csr.indices.astype(np.int64)
+        order = np.argsort(keys)
+        self.neighbors[slots] = csr.indices
+        self.twin[slots] = slots[order[np.searchsorted(keys[order], csr.indices.astype(np.int64) * N + sources)]]
+        self._csr = None
+
+    def csr(self):
+        if self._csr is None:
+            indptr = np.zeros(self.N + 1, dtype=np.int64)
+            np.cumsum(self.degree, out=indptr[1:])
+            slots = np.repeat(self.start - indptr[:-1], self.degree) + np.arange(indptr[-1])
+            self._csr = CSRGraph(np.arange(self.N), indptr, self.neighbors[slots], self.degree.copy())
+        return self._csr
+
+    def slot(self, i, j):
+        block = self.neighbors[self.start[i]:self.start[i] + self.degree[i]]
+        found = np.flatnonzero(block == j)
+        return int(self.start[i] + found[0]) if len(found) else -1
+
+    def has_edge(self, i, j):
+        if self.degree[i] > self.degree[j]:
+            i, j = j, i
+        return self.slot(i, j) >= 0
+
+    def _relocate(self, i):
+        capacity = 2 * int(self.capacity[i])
+        if self.used + capacity > len(self.neighbors):
+            size = max(2 * len(self.neighbors), self.used + capacity)
+            self.neighbors = np.resize(self.neighbors, size)
+            self.twin = np.resize(self.twin, size)
+        old, new, d = self.start[i], self.used, self.degree[i]
+        self.neighbors[new:new + d] = self.neighbors[old:old + d]
+        self.twin[new:new + d] = self.twin[old:old + d]
+        self.twin[self.twin[new:new + d]] = np.arange(new, new + d)
+        self.unused += int(self.capacity[i])
+        self.start[i], self.capacity[i] = new, capacity
+        self.used += capacity
+
+    def _append(self, i, j):
+        if self.degree[i] == self.capacity[i]:
+            self._relocate(i)
+        slot = int(self.start[i] + self.degree[i])
+        self.neighbors[slot] = j
+        self.degree[i] += 1
+        return slot
+
+    def _remove_slot(self, i, slot):
+        last = int(self.start[i] + self.degree[i] - 1)
+        if slot != last:
+            self.neighbors[slot] = self.neighbors[last]
+            self.twin[slot] = self.twin[last]
+            self.twin[self.twin[slot]] = slot
+        self.degree[i] -= 1
+
+    def add_edge(self, i, j):
+        a = self._append(i, j)
+        b = self._append(j, i)
+        self.twin[a], self.twin[b] = b, a
+        self._csr = None
+        if self.unused > self.used // 2:
+            self.__init__(self.csr(), self.slack)
+
+    def remove_edge(self, i, j):
+        a = self.slot(i, j)
+        if a < 0:
+            return False
+        b = int(self.twin[a])
+        self._remove_slot(i, a)
+        self._remove_slot(j, b)
+        self._csr = None
+        return True
+
+def defector_rewiring(graph, csr, s, payoffs, rng, W):
+    j = _random_neighbors(csr, s.shape, rng)
+    i = np.flatnonzero((s == 1) & (csr.degree > 0) & (s[j] == 0) & (rng.random(s.shape) < W))
+    return i, j[i], rng.integers(0, len(s), len(i))
+
+def payoff_rewiring(graph, csr, s, payoffs, rng, W):
+    j = _random_neighbors(csr, s.shape, rng)
+    i = np.flatnonzero((csr.degree > 0) & (s[j] == 0) & (payoffs[j] > payoffs) & (rng.random(s.shape) < W))
+    k = _random_neighbors(csr, s.shape, rng)[j[i]]
+    return i, j[i], k
+
+rewiring_rules = (defector_rewiring, payoff_rewiring)
+
+def rewire(graph, state, s, i, j, k, matrix):
+    x = s.tolist()
+    c = state.cooperating
+    touched = []
+    for a, b, d in zip(i.tolist(), j.tolist(), k.tolist()):
+        if a == d or graph.has_edge(a, d) or not graph.remove_edge(a, b):
+            continue
+        graph.add_edge(a, d)
+        c[a] += x[d] - x[b]
+        c[b] -= x[a]
+        c[d] += x[a]
+        touched += [a, b, d]
+    if touched:
+        touched = np.unique(touched)
+        state.payoffs[touched] = _payoffs_from_counts(graph.degree[touched], s[touched], c[touched], matrix)
+    return len(touched) // 3
+
+def coevolution_game_simulation(G, T, S, update_rule, rewiring_rule=defector_rewiring, W=0.1, plot_time=False, rng=None, matrix=None):
+    rng = np.random.default_rng(rng)
+    kernel = rule_kernels.get(update_rule, update_rule)
+    graph = G if isinstance(G, DynamicGraph) else DynamicGraph(G if isinstance(G, CSRGraph) else csr_graph(G))
+    N = graph.N
+    s = np.ones(N, dtype=np.uint8)
+    s[rng.choice(N, round(config.d_0 * N), replace=False)] = 0
+    P = 0
+    p_t = [s.sum()/N,]
+    matrix = _payoff_matrix(T, S, matrix)
+    state = payoff_state(graph.csr(), s, matrix)
+    default = matrix.R == 1 and matrix.P == 0 and matrix.normalization == 'accumulated'
+    for t in range(0, config.Tmax):
+        csr = graph.csr()
+        constants = None if default else rule_constants(csr, T, S, matrix)
+        s, s_old = kernel(csr, s, state.payoffs, T, S, rng, constants), s
+        state = update_payoff_state(state, csr, s_old, s, matrix)
+        if rewiring_rule is not None and W > 0:
+            rewire(graph, state, s, *rewiring_rule(graph, csr, s, state.payoffs, rng, W), matrix)
+        C_len = int(s.sum())
+        if C_len == 0:
+            return 0
+        if C_len == N:
+            return 1
+
+        if plot_time == True:
+            p_t.append(C_len/N)
+
+        if t >= config.Ttrans:
+            P += C_len
+
+    p = P/(N*(config.Tmax-config.Ttrans))
+
+    if plot_time == True:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(10,6))
+        plt.title(f'N = {N}, S = {S}, T = {T}, W = {W}')
+        plt.plot(p_t)
+        plt.xlabel('time')
+        plt.ylabel('fraction of cooperators')
+
+    return p
+
+def notebook_experiments():
+    import networkx as nx
+    previous = configure(SimulationConfig())
+
+    """##  ▶ First experiment : Complete graphs"""
+
+    complete_graph_100 = nx.complete_graph(100)
+
+    nx.draw(complete_graph_100, with_labels=True)
+
+    """##Results using the first game simulation defined
 
 Each simulation had a time of running equal to 2 full hours and sometimes even 3 hours.
 
@@ -432,45 +2690,45 @@ The "Moran_rule" Update rule took a lot of time to completely run.
 ###Weak Prisoner Dilemma for the following update rules : replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule and fermi_rule.
 """
 
-plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma, update_rules=[replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule, fermi_rule])
+    plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma, update_rules=[replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule, fermi_rule])
 
-"""###Weak Prisoner Dilemma for all the update rules"""
+    """###Weak Prisoner Dilemma for all the update rules"""
 
-plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma)
+    plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma)
 
-"""###Stag Hunt for the following update rules : replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule and fermi_rule."""
+    """###Stag Hunt for the following update rules : replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, moran_rule and fermi_rule."""
 
-plots(complete_graph_100, 'complete graph 100', stag_hunt)
+    plots(complete_graph_100, 'complete graph 100', stag_hunt)
 
-"""We only presented these update rules because they were more significant when plotting all of the update rules. """
+    """We only presented these update rules because they were more significant when plotting all of the update rules. """
 
-plots(complete_graph_100, 'complete graph 100', stag_hunt, update_rules=[replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, fermi_rule])
+    plots(complete_graph_100, 'complete graph 100', stag_hunt, update_rules=[replicator_rule, multiple_replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Snow Drift for all the update rules"""
+    """###Snow Drift for all the update rules"""
 
-plots(complete_graph_100, 'complete graph 100', snow_drift)
+    plots(complete_graph_100, 'complete graph 100', snow_drift)
 
-"""###Hawk Dove for all the updates rules"""
+    """###Hawk Dove for all the updates rules"""
 
-plots(complete_graph_100, 'complete graph 100', hawk_dove)
+    plots(complete_graph_100, 'complete graph 100', hawk_dove)
 
-"""According to the paper "Evolutionary game theory: Temporal and spatial effects beyond replicator dynamics" by Roca, Cuesta, and Sánchez, the impact of update rules in a complete network, which represents a well-mixed or unstructured population, may not significantly alter the overall evolutionary outcome. In such networks, differences between update rules may have minimal relevance.
+    """According to the paper "Evolutionary game theory: Temporal and spatial effects beyond replicator dynamics" by Roca, Cuesta, and Sánchez, the impact of update rules in a complete network, which represents a well-mixed or unstructured population, may not significantly alter the overall evolutionary outcome. In such networks, differences between update rules may have minimal relevance.
 
 ###Game Simulation temporal representation
 """
 
-game_simulation(complete_graph_100, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
+    game_simulation(complete_graph_100, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
 
-"""##Some results using the second game simulation
+    """##Some results using the second game simulation
 
 In this part, we wanted to experiment with the second game simulation and see what result we can get. Overall we tried it with the weak prisoner dilemma and the stag hunt. And we see already some differences with the first simulation result.
 """
 
-plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma)
+    plots(complete_graph_100, 'complete graph 100', weak_prisoner_dilemma)
 
-plots(complete_graph_100, 'complete graph 100', stag_hunt)
+    plots(complete_graph_100, 'complete graph 100', stag_hunt)
 
-"""## ▶ Second Experiment : Community networks
+    """## ▶ Second Experiment : Community networks
 
 ##Built In Community Graph
 
@@ -482,308 +2740,289 @@ We said that it's bilt i sice we are defiig te vales :
 - num_communities = 4
 """
 
-N = 100  # Total number of nodes
-k = 10   # Average node degree
-p_in = 0.3  # Probability of generating an edge within the same community
-p_out = 0.05  # Probability of generating an edge between different communities
-num_communities = 4  # Number of communities
-
-G = generate_community_network(N, k, p_in, p_out, num_communities)
-
-nx.draw(G, with_labels=True)
+    N = 100  # Total number of nodes
+    k = 10   # Average node degree
+    p_in = 0.3  # Probability of generating an edge within the same community
+    p_out = 0.05  # Probability of generating an edge between different communities
+    num_communities = 4  # Number of communities
 
-"""###Weak Prisoner Dilemma"""
+    G = generate_community_network(N, k, p_in, p_out, num_communities)
 
-plots(G, 'community network', weak_prisoner_dilemma)
+    nx.draw(G, with_labels=True)
 
-"""###Stag Hunt"""
+    """###Weak Prisoner Dilemma"""
 
-plots(G, 'community network', stag_hunt)
+    plots(G, 'community network', weak_prisoner_dilemma)
 
-"""###Hawk Dove"""
+    """###Stag Hunt"""
 
-plots(G, 'community network', hawk_dove )
+    plots(G, 'community network', stag_hunt)
 
-"""###Snow Drift"""
+    """###Hawk Dove"""
 
-plots(G, 'community network', snow_drift)
+    plots(G, 'community network', hawk_dove )
 
-"""##LFR Community Grap :  Lancichinetti–Fortunato–Radicchi benchmark"""
+    """###Snow Drift"""
 
-n = 100
-tau1 = 4
-tau2 = 2.5
-mu = 0.2
-LFR_100 = nx.LFR_benchmark_graph(n, tau1, tau2, mu, average_degree=5, min_community=10)
+    plots(G, 'community network', snow_drift)
 
-nx.draw(LFR_100, with_labels=True)
+    """##LFR Community Grap :  Lancichinetti–Fortunato–Radicchi benchmark"""
 
-"""###Weak Prisoner Dilemma"""
+    n = 100
+    tau1 = 4
+    tau2 = 2.5
+    mu = 0.2
+    LFR_100 = nx.LFR_benchmark_graph(n, tau1, tau2, mu, average_degree=5, min_community=10)
 
-plots(LFR_100, 'LFR_100', weak_prisoner_dilemma)
+    nx.draw(LFR_100, with_labels=True)
 
-"""###Hawk Dove"""
+    """###Weak Prisoner Dilemma"""
 
-plots(LFR_100, 'LFR_100', hawk_dove)
+    plots(LFR_100, 'LFR_100', weak_prisoner_dilemma)
 
-"""###Snow Drift"""
+    """###Hawk Dove"""
 
-plots(LFR_100, 'LFR_100', snow_drift)
+    plots(LFR_100, 'LFR_100', hawk_dove)
 
-"""###Stag Hunt"""
+    """###Snow Drift"""
 
-plots(LFR_100, 'LFR_100', stag_hunt)
+    plots(LFR_100, 'LFR_100', snow_drift)
 
-"""##Stochastic Block Model Graph"""
+    """###Stag Hunt"""
 
-import networkx as nx
-import numpy as np
+    plots(LFR_100, 'LFR_100', stag_hunt)
 
-n = 100  # Total number of nodes
-k = 5  # Average node degree
-p_in = 0.8  # Probability of generating an edge within the same community
-p_out = 0.1  # Probability of generating an edge between different communities
-num_communities = 4  # Number of communities
+    """##Stochastic Block Model Graph"""
 
-# Create the block connectivity matrix
-p_matrix = np.full((num_communities, num_communities), p_out)
-np.fill_diagonal(p_matrix, p_in)
+    n = 100  # Total number of nodes
+    k = 5  # Average node degree
+    p_in = 0.8  # Probability of generating an edge within the same community
+    p_out = 0.1  # Probability of generating an edge between different communities
+    num_communities = 4  # Number of communities
 
-# Generate the SBM graph
-G = nx.stochastic_block_model([n//num_communities]*num_communities, p_matrix)
+    # Create the block connectivity matrix
+    p_matrix = np.full((num_communities, num_communities), p_out)
+    np.fill_diagonal(p_matrix, p_in)
 
-# Print some information about the graph
-print("Generated Stochastic Block Model (SBM) graph:")
-print("Number of nodes:", G.number_of_nodes())
-print("Number of edges:", G.number_of_edges())
+    # Generate the SBM graph
+    G = nx.stochastic_block_model([n//num_communities]*num_communities, p_matrix)
 
-nx.draw(G, with_labels=True)
+    # Print some information about the graph
+    print("Generated Stochastic Block Model (SBM) graph:")
+    print("Number of nodes:", G.number_of_nodes())
+    print("Number of edges:", G.number_of_edges())
 
-"""###Weak Prisoner Dilemma"""
+    nx.draw(G, with_labels=True)
 
-plots(G, 'SBM', weak_prisoner_dilemma)
+    """###Weak Prisoner Dilemma"""
 
-"""###Hawk Dove"""
+    plots(G, 'SBM', weak_prisoner_dilemma)
 
-plots(G, 'SBM', hawk_dove)
+    """###Hawk Dove"""
 
-"""###Stag Hunt"""
+    plots(G, 'SBM', hawk_dove)
 
-plots(G, 'SBM', stag_hunt)
+    """###Stag Hunt"""
 
-"""###Snow Drift"""
+    plots(G, 'SBM', stag_hunt)
 
-plots(G, 'SBM', snow_drift)
+    """###Snow Drift"""
 
-"""## ▶ Tird Experiment : Small World Network"""
+    plots(G, 'SBM', snow_drift)
 
-N = 100  # Total number of nodes
-k = 10   # Average node degree
-p = 0.3  # Probability of rewiring edges
+    """## ▶ Tird Experiment : Small World Network"""
 
-G = generate_small_world_network(N, k, p)
+    N = 100  # Total number of nodes
+    k = 10   # Average node degree
+    p = 0.3  # Probability of rewiring edges
 
-nx.draw(G, with_labels=True)
+    G = generate_small_world_network(N, k, p)
 
-"""###Weak Prisoner Dilemma"""
+    nx.draw(G, with_labels=True)
 
-plots(G, 'Watts–Strogatz', weak_prisoner_dilemma)
+    """###Weak Prisoner Dilemma"""
 
-"""###Hawk Dove"""
+    plots(G, 'Watts–Strogatz', weak_prisoner_dilemma)
 
-plots(G, 'Watts–Strogatz', hawk_dove)
+    """###Hawk Dove"""
 
-"""###Snow Drift"""
+    plots(G, 'Watts–Strogatz', hawk_dove)
 
-plots(G, 'Watts–Strogatz', snow_drift)
+    """###Snow Drift"""
 
-"""###Stag Hunt"""
+    plots(G, 'Watts–Strogatz', snow_drift)
 
-plots(G, 'Watts–Strogatz', stag_hunt)
+    """###Stag Hunt"""
 
-"""## ▶ Fort Experiment : Real World Network"""
+    plots(G, 'Watts–Strogatz', stag_hunt)
 
-import networkx as nx
+    """## ▶ Fort Experiment : Real World Network"""
 
-G = nx.karate_club_graph()
+    G = nx.karate_club_graph()
 
-nx.draw(G, with_labels=True)
+    nx.draw(G, with_labels=True)
 
-"""###Weak Prisoner Dilemma"""
+    """###Weak Prisoner Dilemma"""
 
-plots(G, 'Karate Club', weak_prisoner_dilemma)
+    plots(G, 'Karate Club', weak_prisoner_dilemma)
 
-"""###Hawk Dove"""
+    """###Hawk Dove"""
 
-plots(G, 'Karate Club', hawk_dove)
+    plots(G, 'Karate Club', hawk_dove)
 
-"""###Stag Hunt"""
+    """###Stag Hunt"""
 
-plots(G, 'Karate Club', stag_hunt)
+    plots(G, 'Karate Club', stag_hunt)
 
-"""###Snow Drift"""
+    """###Snow Drift"""
 
-plots(G, 'Karate Club', snow_drift)
+    plots(G, 'Karate Club', snow_drift)
 
-"""## ▶ Fift Experiment : Homogeneous Random Graph"""
+    """## ▶ Fift Experiment : Homogeneous Random Graph"""
 
-randregular_100_5 = nx.random_regular_graph(5,100)
+    randregular_100_5 = nx.random_regular_graph(5,100)
 
-nx.draw(randregular_100_5, with_labels=True)
+    nx.draw(randregular_100_5, with_labels=True)
 
-"""###Weak Prisoner Dilemma"""
+    """###Weak Prisoner Dilemma"""
 
-plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma)
+    plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma)
 
-"""###Stag Hunt"""
+    """###Stag Hunt"""
 
-plots(randregular_100_5, 'random regular graph 100 5', stag_hunt)
+    plots(randregular_100_5, 'random regular graph 100 5', stag_hunt)
 
-"""###Snow Drift"""
+    """###Snow Drift"""
 
-plots(randregular_100_5, 'random regular graph 100 5', snow_drift)
+    plots(randregular_100_5, 'random regular graph 100 5', snow_drift)
 
-"""###Hawk Dove"""
+    """###Hawk Dove"""
 
-plots(randregular_100_5, 'random regular graph 100 5', hawk_dove)
+    plots(randregular_100_5, 'random regular graph 100 5', hawk_dove)
 
-"""###Game Simulation temporal representation """
+    """###Game Simulation temporal representation """
 
-game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
+    game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
 
-"""###Snow Drift with Tmax = 1000"""
+    """###Snow Drift with Tmax = 1000"""
 
-Tmax = 1000
-Tmin = 900
-plots(randregular_100_5, 'random regular graph 100 5', snow_drift, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    configure(Tmax=1000, Ttrans=900)
+    plots(randregular_100_5, 'random regular graph 100 5', snow_drift, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Weak Prisoner Dilemma with Tmax = 1000"""
+    """###Weak Prisoner Dilemma with Tmax = 1000"""
 
-Tmax = 1000
-Tmin = 900
-plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    configure(Tmax=1000, Ttrans=900)
+    plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Hawk Dove with Tmax = 1000"""
+    """###Hawk Dove with Tmax = 1000"""
 
-Tmax = 1000
-Tmin = 900
-plots(randregular_100_5, 'random regular graph 100 5', hawk_dove, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    configure(Tmax=1000, Ttrans=900)
+    plots(randregular_100_5, 'random regular graph 100 5', hawk_dove, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Stag Hunt with Tmax = 1000"""
+    """###Stag Hunt with Tmax = 1000"""
 
-Tmax = 1000
-Tmin = 900
-plots(randregular_100_5, 'random regular graph 100 5', stag_hunt, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    configure(Tmax=1000, Ttrans=900)
+    plots(randregular_100_5, 'random regular graph 100 5', stag_hunt, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Game Simulation temporal representation with T = 1000"""
+    """###Game Simulation temporal representation with T = 1000"""
 
-game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
+    game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
 
-"""###Game Simulation temporal representation with T = 10000"""
+    """###Game Simulation temporal representation with T = 10000"""
 
-Tmax = 10000
-game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
+    configure(Tmax=10000)
+    game_simulation(randregular_100_5, T = 0.49005001, S = -0.49005001, update_rule=replicator_rule, plot_time=True)
 
-"""###Game Simulation temporal representation with T = 1000 and T = 1 and S = 1"""
+    """###Game Simulation temporal representation with T = 1000 and T = 1 and S = 1"""
 
-game_simulation(randregular_100_5, T = 1, S = 1, update_rule=replicator_rule, plot_time=True)
+    game_simulation(randregular_100_5, T = 1, S = 1, update_rule=replicator_rule, plot_time=True)
 
-"""###Game Simulation temporal representation with T = 1000 and T = 1,5 and S = 0,5"""
+    """###Game Simulation temporal representation with T = 1000 and T = 1,5 and S = 0,5"""
 
-game_simulation(randregular_100_5, T = 1.5, S = 0.5, update_rule=replicator_rule, plot_time=True)
+    game_simulation(randregular_100_5, T = 1.5, S = 0.5, update_rule=replicator_rule, plot_time=True)
 
-"""
+    """
 The results indicate that the fraction of cooperators in the unconditional imitation rule varies significantly based on the random initialization of cooperator and defector nodes, even when the S and T values remain constant."""
 
-Ttrans = 9000
-Tmax = 10000
-for _ in range(0,10):
-    print(game_simulation(randregular_100_5, T = 1.5, S = 0.5, update_rule=unconditional_imitation_rule, plot_time=True))
+    configure(Tmax=10000, Ttrans=9000)
+    for _ in range(0,10):
+        print(game_simulation(randregular_100_5, T = 1.5, S = 0.5, update_rule=unconditional_imitation_rule, plot_time=True))
 
-"""In the case of homogeneous random networks, it takes a considerably longer time to reach a stationary state compared to the other models. To accommodate this, we have adjusted the maximum simulation time (Tmax) and transient time (Ttrans) accordingly: Ttrans = 9000 and Tmax = 10000. However, due to the increased computational cost, we will only display plots for the replicator rule and unconditional imitation rule. This will allow us to compare the outcomes with subsequent networks that exhibit different degrees of heterogeneity.
+    """In the case of homogeneous random networks, it takes a considerably longer time to reach a stationary state compared to the other models. To accommodate this, we have adjusted the maximum simulation time (Tmax) and transient time (Ttrans) accordingly: Ttrans = 9000 and Tmax = 10000. However, due to the increased computational cost, we will only display plots for the replicator rule and unconditional imitation rule. This will allow us to compare the outcomes with subsequent networks that exhibit different degrees of heterogeneity.
 
 Furthermore, we have reduced the number of repetitions for the Monte Carlo simulation to 20, considering the computational demands. This adjustment will still provide meaningful insights while reducing the overall computational burden.
 
 ###Weak Prisoner Dilemma with T = 10000
 """
 
-Tmax = 10000
-Trans = 9000
+    configure(Tmax=10000, Ttrans=9000)
 
-plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    plots(randregular_100_5, 'random regular graph 100 5', weak_prisoner_dilemma, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Stag Hunt with T = 10000"""
+    """###Stag Hunt with T = 10000"""
 
-plots(randregular_100_5, 'random regular graph 100 5', stag_hunt, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    plots(randregular_100_5, 'random regular graph 100 5', stag_hunt, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Snow Drift with T = 10000"""
+    """###Snow Drift with T = 10000"""
 
-plots(randregular_100_5, 'random regular graph 100 5', snow_drift, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    plots(randregular_100_5, 'random regular graph 100 5', snow_drift, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""###Hawk Dove  with T = 10000"""
+    """###Hawk Dove  with T = 10000"""
 
-plots(randregular_100_5, 'random regular graph 100 5', hawk_dove, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
+    plots(randregular_100_5, 'random regular graph 100 5', hawk_dove, update_rules=[generous_tit_for_tat_rule, replicator_rule, unconditional_imitation_rule, fermi_rule])
 
-"""## ▶ Sixth Experiment : Barabasi Albert Graph """
+    """## ▶ Sixth Experiment : Barabasi Albert Graph """
 
-Nrep = 50
-Tmax = 500
-Trans = 400
+    configure(Nrep=50, Tmax=500, Ttrans=400)
 
-N = 100
-K = 5
-BA_100_5 = nx.barabasi_albert_graph(N, K)
+    N = 100
+    K = 5
+    BA_100_5 = nx.barabasi_albert_graph(N, K)
 
-nx.draw(BA_100_5, with_labels=True)
+    nx.draw(BA_100_5, with_labels=True)
 
-"""###Weak Prisoner Dilemma"""
+    """###Weak Prisoner Dilemma"""
 
-plots(BA_100_5, 'BA_100_5', weak_prisoner_dilemma)
+    plots(BA_100_5, 'BA_100_5', weak_prisoner_dilemma)
 
-"""###Hawk Dove"""
+    """###Hawk Dove"""
 
-plots(BA_100_5, 'BA_100_4', hawk_dove)
+    plots(BA_100_5, 'BA_100_4', hawk_dove)
 
-"""###Stag Hunt"""
+    """###Stag Hunt"""
 
-plots(BA_100_5, 'BA_100_4', stag_hunt)
+    plots(BA_100_5, 'BA_100_4', stag_hunt)
 
-"""###Snow Drift"""
+    """###Snow Drift"""
 
-plots(BA_100_5, 'BA_100_4', snow_drift)
+    plots(BA_100_5, 'BA_100_4', snow_drift)
 
-"""## ▶ Seventh Experiment : Erdos Renyi Graph"""
+    """## ▶ Seventh Experiment : Erdos Renyi Graph"""
 
-def ER_Gnk(N,K):
-    G=nx.Graph()
-    G.add_nodes_from([i for i in range(N)])
-    n_edges=0
-    while n_edges<K:
-        edge=rd.choice(list(combinations(G,2)))
-        if (edge[0],edge[1]) not in G.edges():
-            G.add_edge(edge[0],edge[1])
-            n_edges+=1
-    return G
+    N = 100
+    avg_degree = 5
+    K = N*(avg_degree)/2
+    ER_100_5 = ER_Gnk(N,K)
+
+    nx.draw(ER_100_5, with_labels=True)
 
-N = 100
-avg_degree = 5
-K = N*(avg_degree)/2
-ER_100_5 = ER_Gnk(N,K)
+    """###Weak Prisoner Dilemma"""
 
-nx.draw(ER_100_5, with_labels=True)
+    plots(ER_100_5, 'ER_100_5', weak_prisoner_dilemma)
 
-"""###Weak Prisoner Dilemma"""
+    """###Hawk Dove"""
 
-plots(ER_100_5, 'ER_100_5', weak_prisoner_dilemma)
+    plots(ER_100_5, 'ER_100_5', hawk_dove)
 
-"""###Hawk Dove"""
+    """###Stag Hunt"""
 
-plots(ER_100_5, 'ER_100_5', hawk_dove)
+    plots(ER_100_5, 'ER_100_5', stag_hunt)
 
-"""###Stag Hunt"""
+    """###Snow Drift"""
 
-plots(ER_100_5, 'ER_100_5', stag_hunt)
+    plots(ER_100_5, 'ER_100_5', snow_drift)
 
-"""###Snow Drift"""
+    configure(previous)
 
-plots(ER_100_5, 'ER_100_5', snow_drift)
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
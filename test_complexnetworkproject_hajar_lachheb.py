@@ -0,0 +1,420 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import complexnetworkproject_hajar_lachheb as cn
+
+
+@pytest.fixture(autouse=True)
+def small_config():
+    previous = cn.configure(Nrep=2, Tmax=20, Ttrans=10, n_points=3)
+    yield
+    cn.configure(previous)
+
+
+def test_moran_rule_zero_denominator_is_no_update():
+    G = nx.barabasi_albert_graph(60, 2, seed=1)
+    for backend in ('networkx', 'csr', 'vectorized'):
+        p = cn.game_simulation(G, 1.9, 0, cn.moran_rule, backend=backend, rng=np.random.default_rng(1))
+        assert 0 <= p <= 1
+
+
+def test_asynchronous_step_stops_at_absorption():
+    G = nx.barabasi_albert_graph(30, 2, seed=1)
+    for update in ('random_sequential', 'gillespie'):
+        for seed in range(10):
+            assert cn.game_simulation(G, 2, -1, cn.stochastic_best_response_rule, update=update, rng=seed) in (0, 1)
+
+
+def test_plots_batched_accepts_edge_list(tmp_path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    path = tmp_path / 'edges.txt'
+    path.write_text('\n'.join(f'{u} {v}' for u, v in nx.barabasi_albert_graph(40, 2, seed=1).edges()))
+    csr = cn.load_edge_list(path)
+    assert isinstance(csr, cn.CSRGraph)
+    cn.plots(csr, 'edge list', cn.snow_drift, update_rules=[cn.fermi_rule], backend='batched', seed=1)
+    plt.close('all')
+
+
+def test_cache_without_workers_raises(tmp_path):
+    cache = cn.ResultCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        cn.plots(nx.complete_graph(10), 'complete', cn.snow_drift, backend='batched', cache=cache)
+    job = cn.SweepJob(graph={'generator': 'complete', 'N': 10}, game='snow_drift', config=cn.config, cache=str(tmp_path))
+    with pytest.raises(ValueError):
+        cn.run_job(job)
+
+
+def test_checkpoint_resume_equals_uninterrupted():
+    G = nx.barabasi_albert_graph(50, 2, seed=1)
+    for update in ('synchronous', 'random_sequential'):
+        reference = cn.game_simulation(G, 1.5, 0.5, cn.fermi_rule, rng=7, update=update)
+        snapshots = {}
+        for every in (3, 7):
+            snapshots[every] = []
+            p = cn.game_simulation(G, 1.5, 0.5, cn.fermi_rule, rng=7, update=update, checkpoint=snapshots[every].append, checkpoint_every=every)
+            assert p == reference
+        for snapshot in snapshots[7][:-1]:
+            assert cn.game_simulation(G, 1.5, 0.5, cn.fermi_rule, update=update, start=snapshot) == reference
+
+
+def test_saved_snapshot_resumes_exactly(tmp_path):
+    G = nx.barabasi_albert_graph(50, 2, seed=1)
+    reference = cn.game_simulation(G, 1.5, 0.5, cn.moran_rule, rng=3)
+    path = tmp_path / 'snapshot.npz'
+    snapshots = []
+    cn.game_simulation(G, 1.5, 0.5, cn.moran_rule, rng=3, checkpoint=lambda snapshot: snapshots.append(snapshot) if snapshot.step == 9 else None, checkpoint_every=9)
+    cn.save_snapshot(path, snapshots[0])
+    assert cn.game_simulation(G, 1.5, 0.5, cn.moran_rule, start=cn.load_snapshot(path)) == reference
+
+
+def test_instrument_keeps_the_class_engine():
+    G = nx.complete_graph(30)
+    for rule in (cn.moran_rule, cn.fermi_rule):
+        instrument = cn.Instrumentation()
+        p = cn.replica_game_simulation(G, 4, 1.2, 0.2, rule, rng=5)
+        assert np.array_equal(cn.replica_game_simulation(G, 4, 1.2, 0.2, rule, rng=5, instrument=instrument), p)
+        assert [run.engine for run in instrument.runs] == ['classes'] * 4
+        assert instrument.rule_calls[rule.__name__] > 0
+
+
+def test_benchmarks_count_simulated_steps():
+    results = cn.run_benchmarks([cn.fermi_rule], topologies=('complete', 'random_regular'), sizes=(20,), budget=10**5, replicas=2, sweep_points=2)
+    measured = [result for result in results['results'] if 'simulated_steps' in result]
+    assert len(measured) == 2 * len(cn.benchmark_engines)
+    for result in measured:
+        assert result['rows'] == {'batched': 2, 'sweep': 4}.get(result['engine'], 1)
+        assert 0 < result['simulated_steps'] <= result['steps'] * result['rows']
+
+
+def test_rule_normalization_uses_the_whole_matrix():
+    csr = cn.csr_graph(nx.star_graph(4))
+    default = cn.rule_constants(csr, 1.5, -0.5)
+    assert default.phi_scale == 2.0 and default.psi_scale == -0.5
+    assert default.neighbor_max_degree.max() == 4
+    matrix = cn.PayoffMatrix(3, -1, 2, 0.5, 'average')
+    constants = cn.rule_constants(csr, 2, -1, matrix)
+    assert constants.phi_scale == 4.0 and constants.psi_scale == -1
+    assert (constants.edge_max_degree == 1).all() and (constants.neighbor_max_degree == 1).all() and (constants.degree == 1).all()
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    for backend in ('networkx', 'csr', 'vectorized'):
+        for rule in (cn.replicator_rule, cn.multiple_replicator_rule, cn.moran_rule):
+            assert 0 <= cn.game_simulation(G, 2, -1, rule, backend=backend, matrix=matrix, rng=1) <= 1
+
+
+def test_random_regular_dense_and_invalid():
+    for d, N in ((3, 10), (7, 10), (9, 10), (0, 5), (58, 60)):
+        csr = cn.random_regular_csr(d, N, seed=1)
+        G = cn.nx_graph(csr)
+        assert G.number_of_nodes() == N and G.number_of_edges() == N * d // 2
+        assert all(k == d for _, k in G.degree()) and nx.number_of_selfloops(G) == 0
+    for d, N in ((3, 9), (10, 10), (-1, 10)):
+        with pytest.raises(ValueError):
+            cn.random_regular_csr(d, N)
+
+
+def test_unsupported_convergence_raises():
+    G = nx.complete_graph(10)
+    convergence = cn.Convergence(5, 0.01)
+    with pytest.raises(ValueError):
+        cn.MC(G, 2, 1.2, 0.2, cn.fermi_rule, backend='csr', convergence=convergence)
+    with pytest.raises(ValueError):
+        cn.MC(G, 2, 1.2, 0.2, cn.fermi_rule, backend='batched', convergence=convergence, precision=cn.Precision())
+    assert 0 <= cn.MC(G, 2, 1.2, 0.2, cn.fermi_rule, backend='batched', convergence=convergence) <= 1
+    job = cn.SweepJob(graph={'generator': 'complete', 'N': 10}, game='snow_drift', config=cn.config, workers=1, convergence=convergence)
+    with pytest.raises(ValueError):
+        cn.run_job(job)
+
+
+def test_csr_payoffs_are_bit_identical():
+    G = nx.barabasi_albert_graph(300, 3, seed=1)
+    csr = cn.csr_graph(G)
+    s = (np.random.default_rng(0).random(300) < 0.5).astype(np.uint8)
+    C = cn.StrategyArray(list(G.nodes()))
+    C.values[:] = s
+    for T, S in ((1.3, -0.3), (1.7, 0.1), (1.9, 0.7)):
+        payoffs = np.array([cn.payoff_node(n, G, C, S, T) for n in G.nodes()])
+        assert np.array_equal(payoffs, cn.payoffs_csr(csr, s, T, S))
+    for rule in (cn.replicator_rule, cn.moran_rule, cn.unconditional_imitation_rule):
+        assert cn.game_simulation(G, 1.3, -0.3, rule, rng=2) == cn.game_simulation(G, 1.3, -0.3, rule, backend='csr', rng=2)
+
+
+def test_replica_streams_are_reproducible():
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    TS_list = [(1.2, 0.1), (1.5, -0.1), (1.8, 0.3)]
+    for rule in (cn.fermi_rule, cn.moran_rule):
+        reference = cn.sweep_game_simulation(G, TS_list, 3, rule, rng=11)
+        assert np.array_equal(cn.sweep_game_simulation(G, TS_list, 3, rule, rng=11), reference)
+        for batch_size in (1, 2, 4):
+            assert np.array_equal(cn.sweep_game_simulation(G, TS_list, 3, rule, rng=11, batch_size=batch_size), reference)
+        assert not np.array_equal(cn.sweep_game_simulation(G, TS_list, 3, rule, rng=12), reference)
+    p_lists = cn.parallel_sweep(G, TS_list, [cn.fermi_rule, cn.moran_rule], 3, workers=1, seed=11, chunk_size=2)
+    assert np.array_equal(p_lists['moran_rule'], cn.sweep_game_simulation(G, TS_list, 3, cn.moran_rule, rng=11))
+    complete = nx.complete_graph(30)
+    assert np.array_equal(cn.replica_game_simulation(complete, 4, 1.1, 0.2, cn.fermi_rule, rng=3), cn.replica_game_simulation(complete, 4, 1.1, 0.2, cn.fermi_rule, rng=3))
+
+
+def _edge_set(csr):
+    return {(min(u, v), max(u, v)) for u, v in zip(cn._edge_sources(csr).tolist(), csr.indices.tolist())}
+
+
+def test_dynamic_graph_matches_static_rebuild():
+    rng = np.random.default_rng(0)
+    graph = cn.DynamicGraph(cn.er_gnk_csr(60, 120, seed=1))
+    edges = _edge_set(graph.csr())
+    for _ in range(3000):
+        a, b = rng.integers(0, 60, 2).tolist()
+        if a == b:
+            continue
+        edge = (min(a, b), max(a, b))
+        if rng.random() < 0.5:
+            assert graph.remove_edge(a, b) == (edge in edges)
+            edges.discard(edge)
+        elif not graph.has_edge(a, b):
+            graph.add_edge(a, b)
+            edges.add(edge)
+    u, v = np.array(sorted(edges)).T
+    static = cn.csr_from_edges(60, u, v)
+    assert _edge_set(graph.csr()) == edges == _edge_set(static)
+    assert np.array_equal(graph.csr().degree, static.degree)
+
+
+def test_rewired_payoffs_match_static_rebuild(monkeypatch):
+    rewire = cn.rewire
+    checks = []
+
+    def checked(graph, state, s, *args):
+        flips = rewire(graph, state, s, *args)
+        csr = graph.csr()
+        u, v = np.array(sorted(_edge_set(csr))).T
+        static = cn.csr_from_edges(graph.N, u, v)
+        assert np.array_equal(state.payoffs, cn.game_payoffs(static, s, args[-1]))
+        checks.append(flips)
+        return flips
+
+    monkeypatch.setattr(cn, 'rewire', checked)
+    for rewiring_rule in (cn.defector_rewiring, cn.payoff_rewiring):
+        for matrix in (None, cn.PayoffMatrix(1, -0.2, 1.3, 0.1, 'average')):
+            graph = cn.DynamicGraph(cn.random_regular_csr(4, 100, seed=2))
+            cn.coevolution_game_simulation(graph, 1.3, -0.2, cn.fermi_rule, rewiring_rule, 0.3, rng=1, matrix=matrix)
+    assert sum(checks) > 0
+
+
+def test_coevolution_without_rewiring_equals_static_graph():
+    csr = cn.er_gnk_csr(100, 300, seed=1)
+    for rule in (cn.replicator_rule, cn.fermi_rule):
+        static = cn.vectorized_game_simulation(csr, 1.3, -0.2, rule, rng=np.random.default_rng(4))
+        assert cn.coevolution_game_simulation(csr, 1.3, -0.2, rule, W=0, rng=4) == static
+
+
+def test_sibling_seeds_give_independent_streams(tmp_path):
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    TS_list = [(1.2, 0.1), (1.5, -0.1)]
+    a, b = np.random.SeedSequence(7).spawn(2)
+    p_a = cn.sweep_game_simulation(G, TS_list, 4, cn.fermi_rule, rng=a)
+    assert not np.array_equal(p_a, cn.sweep_game_simulation(G, TS_list, 4, cn.fermi_rule, rng=b))
+    assert np.array_equal(p_a, cn.sweep_game_simulation(G, TS_list, 4, cn.fermi_rule, rng=np.random.SeedSequence(7).spawn(2)[0]))
+    cache = cn.ResultCache(str(tmp_path))
+    csr = cn.csr_graph(G)
+    task = (cn.fermi_rule, 1.2, 0.1, 0, 0, 4, 0)
+    keys = {cn._sweep_task_key(cache, cn.graph_fingerprint(csr), master, None, task) for master in (a, b, np.random.SeedSequence(7))}
+    assert len(keys) == 3
+
+
+def test_per_node_runs_do_not_share_random_state():
+    from concurrent.futures import ThreadPoolExecutor
+    G = nx.barabasi_albert_graph(60, 2, seed=1)
+    seeds = list(range(6))
+    reference = [cn.game_simulation(G, 1.5, 0.5, cn.fermi_rule, rng=seed) for seed in seeds]
+    with ThreadPoolExecutor(3) as executor:
+        assert list(executor.map(lambda seed: cn.game_simulation(G, 1.5, 0.5, cn.fermi_rule, rng=seed), seeds)) == reference
+    assert cn.random_rule(0, G, set(), 0.5, 1.5, [0.0] * 60) in ('C', 'D')
+    assert cn.fermi_rule(0, G, set(), 0.5, 1.5, [0.0] * 60) in ('C', 'D', None)
+
+
+def test_rules_read_the_matrix_of_their_payoffs():
+    matrix = cn.PayoffMatrix(10, -0.5, 1.5, 0, 'presence')
+    cn.game_simulation(nx.barabasi_albert_graph(40, 2, seed=1), 1.5, -0.5, cn.replicator_rule, matrix=matrix, rng=1)
+    G = nx.complete_graph(3)
+    assert {cn.replicator_rule(0, G, {1, 2}, -0.5, 1.5, [0.0, 4.0, 4.0]) for _ in range(200)} == {'C'}
+    payoffs = cn.Payoffs([0.0, 4.0, 4.0], matrix=matrix)
+    assert {cn.replicator_rule(0, G, {1, 2}, -0.5, 1.5, payoffs) for _ in range(200)} == {'C', None}
+
+
+def test_snowdrift_backends():
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    for backend in ('networkx', 'csr'):
+        assert 0 <= cn.snowdrift_game_simulation(G, cn.R, cn.C, cn.update_rule, backend=backend, rng=1) <= 1
+    assert cn.snowdrift_game_simulation(G, cn.R, cn.C, cn.update_rule, backend='networkx', rng=1) == cn.snowdrift_game_simulation(G, cn.R, cn.C, cn.update_rule, backend='csr', rng=1)
+    with pytest.raises(ValueError):
+        cn.snowdrift_game_simulation(G, cn.R, cn.C, cn.update_rule, backend='vectorized', rng=1)
+
+
+def test_precision_conflicts_raise():
+    G = nx.complete_graph(10)
+    precision = cn.Precision()
+    for kwargs in ({'backend': 'batched'}, {'backend': 'csr'}, {'update': 'random_sequential'}):
+        with pytest.raises(ValueError):
+            cn.MC(G, 2, 1.5, 0.5, cn.fermi_rule, precision=precision, **kwargs)
+    for kwargs in ({'workers': 2}, {'backend': 'batched'}, {'update': 'random_sequential'}):
+        with pytest.raises(ValueError):
+            cn.plots(G, 'complete', cn.snow_drift, [cn.fermi_rule], precision=precision, **kwargs)
+    job = cn.SweepJob(graph={'generator': 'complete', 'N': 10}, game='snow_drift', config=cn.config, workers=2, precision=precision)
+    with pytest.raises(ValueError):
+        cn.run_job(job)
+
+
+def test_monitor_matches_fixed_horizon_on_slow_drift():
+    cn.configure(Tmax=10000, Ttrans=9000)
+    csr = cn.watts_strogatz_csr(300, 4, 0.1, seed=1)
+    monitored = cn.replica_game_simulation(csr, 6, 1.1, 0.5, cn.replicator_rule, rng=1, convergence=cn.Convergence())
+    fixed = cn.replica_game_simulation(csr, 6, 1.1, 0.5, cn.replicator_rule, rng=1)
+    assert abs(monitored.p.mean() - fixed.mean()) <= cn.Convergence().tolerance
+    assert monitored.stop_step.max() < cn.config.Ttrans
+
+
+def test_class_engine_matches_rows_engine():
+    cn.configure(Tmax=60, Ttrans=40)
+    csr = cn.csr_graph(nx.complete_graph(30))
+    TS = np.repeat([(1.1, 0.1), (0.8, -0.2), (1.2, 0.8)], 400, axis=0)
+    for rule in cn.class_rules:
+        classes = cn._simulate_classes([30], [[1]], TS[:, 0], TS[:, 1], rule, np.random.default_rng(1)).reshape(3, -1)
+        rows = cn._simulate_rows(csr, TS[:, 0], TS[:, 1], cn.rule_kernels[rule], np.random.default_rng(2)).reshape(3, -1)
+        se = np.sqrt((classes.var(axis=1) + rows.var(axis=1)) / classes.shape[1])
+        assert (np.abs(classes.mean(axis=1) - rows.mean(axis=1)) <= 2 * se).all(), rule.__name__
+
+
+def test_update_payoff_state_matches_fresh_state():
+    rng = np.random.default_rng(3)
+    csr = cn.er_gnk_csr(80, 240, seed=1)
+    for normalization in ('accumulated', 'average', 'presence'):
+        for shape, T, S in (((80,), 1.4, -0.3), ((5, 80), rng.uniform(0, 2, (5, 1)), rng.uniform(-1, 1, (5, 1)))):
+            matrix = cn._payoff_matrix(T, S, cn.PayoffMatrix(0.9, S, T, 0.1, normalization))
+            s = (rng.random(shape) < 0.5).astype(np.uint8)
+            state = cn.payoff_state(csr, s, matrix)
+            for flips in (1, 3, 40) * 4:
+                s_new = s ^ (rng.random(shape) < flips / 80)
+                state = cn.update_payoff_state(state, csr, s, s_new, matrix)
+                fresh = cn.payoff_state(csr, s_new, matrix)
+                assert np.array_equal(state.cooperating, fresh.cooperating)
+                assert np.allclose(state.payoffs, fresh.payoffs)
+                s = s_new
+
+
+def test_kernels_match_per_node_rules():
+    cn.configure(Tmax=30, Ttrans=15)
+    G = nx.barabasi_albert_graph(20, 2, seed=1)
+    n = 150
+    for rule in cn.class_rules:
+        for T, S in ((1.3, -0.2), (1.2, 0.6)):
+            nodes = np.array([cn.game_simulation(G, T, S, rule, rng=seed) for seed in np.random.SeedSequence(11).spawn(n)])
+            batched = cn.replica_game_simulation(G, n, T, S, rule, rng=12)
+            se = np.sqrt((nodes.var() + batched.var()) / n)
+            assert abs(nodes.mean() - batched.mean()) <= 3 * se, rule.__name__
+
+
+def test_trajectory_round_trip(tmp_path):
+    class Capture:
+        def begin(self, degree, s):
+            self.degree, self.states = degree, [s.copy()]
+
+        def record(self, s):
+            self.states.append(s.copy())
+
+        def close(self):
+            pass
+
+    G = nx.barabasi_albert_graph(50, 2, seed=1)
+    capture = Capture()
+    cn.game_simulation(G, 1.5, 0.5, cn.random_rule, rng=3, recorder=capture)
+    states = np.array(capture.states)
+    for compress in (True, False):
+        path = str(tmp_path / str(compress))
+        cn.game_simulation(G, 1.5, 0.5, cn.random_rule, rng=3, recorder=cn.TrajectoryRecorder(path, chunk_steps=3, compress=compress))
+        trajectory = cn.Trajectory(path)
+        assert len(trajectory) == len(states)
+        assert np.array_equal(trajectory.read('fraction'), states.mean(axis=1))
+        assert np.array_equal(trajectory.read('fraction', 4, 8), states[4:8].mean(axis=1))
+        classes = [(states[:, capture.degree == k]).sum(axis=1) for k in trajectory.degrees]
+        assert np.array_equal(trajectory.read('degree_classes'), np.array(classes).T)
+        assert trajectory.class_sizes.sum() == 50
+        for t in range(len(states)):
+            assert np.array_equal(trajectory.strategies(t), states[t])
+
+
+def test_branches_warm_starts_and_annealing():
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    snapshots = []
+    cn.game_simulation(G, 1.5, 0.5, cn.random_rule, rng=3, checkpoint=snapshots.append, checkpoint_every=5)
+    branches = cn.branch_snapshot(snapshots[0], 3, seed=2)
+    assert all(b.step == 5 and b.P == snapshots[0].P and np.array_equal(b.strategies, snapshots[0].strategies) for b in branches)
+    runs = [cn.game_simulation(G, 1.5, 0.5, cn.random_rule, start=b) for b in branches]
+    assert runs == [cn.game_simulation(G, 1.5, 0.5, cn.random_rule, start=b) for b in cn.branch_snapshot(snapshots[0], 3, seed=2)]
+    finals = []
+    for b in branches:
+        cn.game_simulation(G, 1.5, 0.5, cn.random_rule, start=b, checkpoint=finals.append)
+    assert len({final.strategies.tobytes() for final in finals}) == 3
+    warm = cn.warm_start(snapshots[-1], 4)
+    assert (warm.step, warm.P) == (cn.config.Ttrans - 4, 0) and np.array_equal(warm.strategies, snapshots[-1].strategies)
+    resumed = []
+    cn.game_simulation(G, 1.5, 0.5, cn.random_rule, start=warm, checkpoint=resumed.append)
+    assert resumed[-1].step == cn.config.Tmax and resumed[-1].P > 0
+
+    TS_list = [(0.5, 0.5), (1.5, -0.1)]
+    annealed = cn.annealed_sweep(G, TS_list, 4, cn.unconditional_imitation_rule, seed=5)
+    swept = cn.sweep_game_simulation(G, TS_list, 4, cn.unconditional_imitation_rule, rng=5)
+    assert annealed[0] == swept[0] == 1
+    assert annealed[1] == 1 and swept[1] < 1
+
+
+def test_refinement_budget_and_reproducibility():
+    G = nx.barabasi_albert_graph(40, 2, seed=1)
+    refinement = cn.Refinement(tolerance=0.05, coarse=5, depth=2)
+    TS_list, p_list, estimates = cn.refine_line(G, cn.weak_prisoner_dilemma, cn.fermi_rule, refinement, Nrep=4, seed=3)
+    assert len(TS_list) > 5 and len(p_list) == len(estimates) == len(TS_list)
+    assert [ts[0] for ts in TS_list] == sorted(ts[0] for ts in TS_list)
+    assert {1.0, 1.25, 1.5, 1.75, 2.0} <= {ts[0] for ts in TS_list}
+    budget = cn.refine_line(G, cn.weak_prisoner_dilemma, cn.fermi_rule, refinement._replace(max_points=7), Nrep=4, seed=3)
+    assert len(budget[0]) == 7
+    full = dict(zip(TS_list, p_list))
+    assert all(full[ts] == p for ts, p in zip(*budget[:2]))
+
+    TS_list, p_list, estimates = cn.refine_plane(G, cn.fermi_rule, (0, 2), (-1, 1), refinement._replace(coarse=3), Nrep=4, seed=3)
+    assert len(TS_list) > 9 and len(p_list) == len(TS_list)
+    budget = cn.refine_plane(G, cn.fermi_rule, (0, 2), (-1, 1), refinement._replace(coarse=3, max_points=14), Nrep=4, seed=3)
+    assert 9 < len(budget[0]) <= 14
+    full = dict(zip(TS_list, p_list))
+    assert all(full[ts] == p for ts, p in zip(*budget[:2]))
+
+
+def test_sweep_command(tmp_path, capsys):
+    import json
+    job = {'graph': {'generator': 'random_regular', 'd': 4, 'N': 40, 'seed': 1}, 'game': [[1.2, 0.1], [1.5, -0.1]],
+           'update_rules': ['fermi_rule', 'replicator_rule'], 'config': {'Nrep': 3, 'Tmax': 20, 'Ttrans': 10}, 'seed': 5}
+    path = tmp_path / 'job.json'
+    path.write_text(json.dumps(job))
+    output = tmp_path / 'out.json'
+    assert cn.main(['sweep', str(path), '--output', str(output)]) is None
+    assert capsys.readouterr().out.strip() == str(output)
+    result = json.loads(output.read_text())
+    assert result['TS'] == job['game'] and result['seed'] == 5 and result['config']['Nrep'] == 3
+    assert result == json.loads(json.dumps(cn.run_job(cn.load_job(str(path)))))
+    assert set(result['p']) == {'fermi_rule', 'replicator_rule'} and all(len(p) == 2 for p in result['p'].values())
+    assert cn.config.Nrep == 2
+    cn.main(['sweep', str(path)])
+    assert json.loads((tmp_path / 'job_results.json').read_text()) == result
+
+
+def test_edge_list_with_mixed_columns(tmp_path):
+    edges = list(nx.barabasi_albert_graph(40, 2, seed=1).edges())
+    plain, mixed, comma = tmp_path / 'plain.txt', tmp_path / 'mixed.txt', tmp_path / 'comma.csv'
+    plain.write_text('\n'.join(f'{u} {v}' for u, v in edges))
+    mixed.write_text('# u v [weight]\n' + '\n'.join(f'{u}\t{v} 0.5 x' if k % 3 else f'{u} {v}' for k, (u, v) in enumerate(edges)) + '\n\n')
+    comma.write_text('\n'.join(f'{u},{v},{k}' if k % 2 else f'{u},{v}' for k, (u, v) in enumerate(edges)))
+    reference = cn.load_edge_list(plain)
+    for path, delimiter in ((mixed, None), (comma, ',')):
+        assert np.array_equal(np.concatenate(list(cn._edge_chunks(path, 7, delimiter=delimiter))), np.array(edges))
+        csr = cn.load_edge_list(path, delimiter=delimiter)
+        assert np.array_equal(csr.indptr, reference.indptr) and np.array_equal(csr.indices, reference.indices)